@@ -0,0 +1,133 @@
+"""
+Daily / annual yield for many installations at once.
+
+Each site has its own latitude, tilt, azimuth (from south, positive west)
+and capacity (kW). Sites are rounded to a grid of `resolution` degrees,
+identical configurations are evaluated once, and configurations sharing
+a latitude share the sun path. The latitude groups are spread over a
+process pool.
+
+Usage:
+
+    python3 batch_yield.py sites.csv [out.csv]
+
+with a CSV header `id,lat,tilt,azimuth,capacity`.
+Without argument, a random table of sites is used.
+"""
+
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from yield_kernel import N_HOUR, DAYS, daily_yield
+
+FIELDS = ("id", "lat", "tilt", "azimuth", "capacity")
+
+
+def load_sites(path):
+    """Read a site table from a CSV file into a structured array."""
+    sites = np.genfromtxt(path, delimiter=",", names=True, dtype=None, encoding="utf-8")
+    missing = [f for f in FIELDS if f not in sites.dtype.names]
+    if missing:
+        raise ValueError("Missing columns in {}: {}".format(path, missing))
+    return np.atleast_1d(sites)
+
+
+def random_sites(n, seed=0):
+    """Random site table, for the demo and the throughput measure."""
+    rng = np.random.default_rng(seed)
+    sites = np.zeros(n, dtype=[("id", "i8"), ("lat", "f8"), ("tilt", "f8"),
+                               ("azimuth", "f8"), ("capacity", "f8")])
+    sites["id"] = np.arange(n)
+    sites["lat"] = rng.uniform(35, 60, n)
+    sites["tilt"] = rng.uniform(0, 60, n)
+    sites["azimuth"] = rng.uniform(-90, 90, n)
+    sites["capacity"] = rng.uniform(3, 500, n)
+    return sites
+
+
+def group_sites(sites, resolution=0.5):
+    """
+    Round the sites parameters to `resolution` and group them.
+
+    Return:
+        - groups: list of (lat, configs), configs being an array (C, 2) of (tilt, azimuth)
+        - index:  for each site, the (group, config) position of its result
+    """
+    q = np.round(np.stack([sites["lat"], sites["tilt"], sites["azimuth"]], axis=1) / resolution)
+    configs, inverse = np.unique(q, axis=0, return_inverse=True)
+    configs = configs * resolution
+
+    lats, lat_inverse = np.unique(configs[:, 0], return_inverse=True)
+    groups = []
+    position = np.empty(len(configs), dtype=int)
+    for g, lat in enumerate(lats):
+        members = np.flatnonzero(lat_inverse == g)
+        position[members] = np.arange(len(members))
+        groups.append((lat, configs[members, 1:]))
+
+    index = np.stack([lat_inverse[inverse.ravel()], position[inverse.ravel()]], axis=1)
+    return groups, index
+
+
+def _run_group(args):
+    lat, configs, n_hour = args
+    return daily_yield(lat, configs[:, 0], configs[:, 1], n_hour=n_hour)
+
+
+def batch_yield(sites, resolution=0.5, n_hour=N_HOUR, workers=None):
+    """
+    Yield of every site of the table.
+
+    Return a dict:
+        - "id", "daily" (S, 365) and "annual" (S,) in kWh,
+        - "n_configs": number of distinct evaluated configurations,
+        - "sites_per_s": throughput.
+    """
+    t = time.perf_counter()
+    groups, index = group_sites(sites, resolution)
+
+    tasks = [(lat, configs, n_hour) for lat, configs in groups]
+    if workers == 1:
+        results = list(map(_run_group, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_run_group, tasks))
+
+    daily = np.empty((len(sites), len(DAYS)))
+    for g, res in enumerate(results):
+        msk = index[:, 0] == g
+        daily[msk] = res[index[msk, 1]]
+    daily *= sites["capacity"][:, None]
+
+    elapsed = time.perf_counter() - t
+    return {
+        "id": sites["id"],
+        "daily": daily,
+        "annual": daily.sum(axis=1),
+        "n_configs": sum(len(c) for _, c in groups),
+        "sites_per_s": len(sites) / elapsed,
+    }
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) > 1:
+        sites = load_sites(sys.argv[1])
+    else:
+        sites = random_sites(5000)
+
+    res = batch_yield(sites)
+    print("{} sites, {} distinct configurations, {:.0f} sites/s".format(
+        len(sites), res["n_configs"], res["sites_per_s"]))
+
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w") as fp:
+            fp.write("id,annual_kwh\n")
+            for i, v in zip(res["id"], res["annual"]):
+                fp.write("{},{:.3f}\n".format(i, v))
+    else:
+        for i in range(min(5, len(sites))):
+            print("site {}: {:.0f} kWh/year".format(res["id"][i], res["annual"][i]))
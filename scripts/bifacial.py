@@ -0,0 +1,196 @@
+"""
+Rear side irradiance and bifacial gain of rows of panels.
+
+2D model of the cross-section of the field, as in `shade_panel_spacing.py`:
+`n_rows` long rows of panels of `length` m (along the slope), tilted by `tilt`,
+lower edge `height` m above the ground, one every `pitch` m. x points to the back
+of the rows (north for south facing rows), z up.
+
+    1. View factors (time independent, once per geometry), by casting rays over
+       each hemisphere, the rows blocking them:
+         - rear surface of each row -> each ground cell, -> sky, -> open ground
+           beyond the field;
+         - each ground cell -> sky.
+    2. Per timestep, the shadow of every row on the ground (an interval of x),
+       so the irradiance of each ground cell: beam where not shaded + diffuse x
+       its sky view factor.
+    3. Rear irradiance of each row = albedo x (ground cells irradiance . view factors)
+       + diffuse from the sky + beam on the rear when the sun is behind the rows.
+
+Steps 2 and 3 are matrix operations over (timesteps, rows, cells): a whole year
+for every row at once. Irradiance: clear sky DNI and DHI of `pv_power.py`,
+isotropic sky.
+"""
+
+import time
+
+import numpy as np
+
+from pv_power import clear_sky_dhi, clear_sky_dni
+from shading import sun_vector
+from yield_kernel import DAYS, SunPath, d2r
+
+N_RAYS = 180
+N_POINTS = 8 # sample points along the rear surface
+
+
+def _ray_hits(origin, direction, seg_a, seg_b):
+    """
+    Distance along the rays (origin (..., 2) + t * direction (..., 2)) to the segments
+    [seg_a, seg_b] (S, 2): array (..., S), inf when missed.
+    """
+    o = origin[..., None, :]
+    d = direction[..., None, :]
+    e = seg_b - seg_a
+    den = d[..., 0] * e[:, 1] - d[..., 1] * e[:, 0]
+    w = seg_a - o
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (w[..., 0] * e[:, 1] - w[..., 1] * e[:, 0]) / den
+        s = (w[..., 0] * d[..., 1] - w[..., 1] * d[..., 0]) / den
+    ok = (den != 0) & (t > 1e-9) & (s >= 0) & (s <= 1)
+    return np.where(ok, t, np.inf)
+
+
+class Rows:
+    """Cross-section of a field of `n_rows` rows (m, degree)."""
+
+    def __init__(self, n_rows=10, pitch=5., length=2., tilt=25., height=1., azimuth=0.,
+                 cell=0.1, margin=15.):
+        self.n_rows = n_rows
+        self.pitch = pitch
+        self.length = length
+        self.tilt = tilt
+        self.height = height
+        self.azimuth = azimuth
+        b = d2r(tilt)
+        self.tangent = np.array([np.cos(b), np.sin(b)])
+        self.rear = np.array([np.sin(b), -np.cos(b)])
+        self.bottom = np.stack([np.arange(n_rows) * pitch, np.full(n_rows, height)], axis=1)
+        self.top = self.bottom + length * self.tangent
+
+        x0, x1 = -margin, self.top[-1, 0] + margin
+        self.edges = np.arange(x0, x1 + cell, cell)
+        self.centers = (self.edges[:-1] + self.edges[1:]) / 2
+        self.view_factors()
+
+    def _cast(self, origin, normal, n_rays=N_RAYS, skip=None):
+        """
+        Weights (2D view factor, cos / 2 dtheta) of the rays from `origin` (P, 2) over
+        the hemisphere of `normal`, split into: ground cells (P, C), open ground beyond
+        the cells (P,), sky (P,). Rays hitting a row (except row `skip`) count for nothing.
+        """
+        theta = (np.arange(n_rays) + 0.5) / n_rays * np.pi - np.pi / 2
+        weight = 0.5 * np.cos(theta) * np.pi / n_rays
+        tangent = np.array([normal[1], -normal[0]])
+        d = np.cos(theta)[:, None] * normal + np.sin(theta)[:, None] * tangent # (J, 2)
+        d = np.broadcast_to(d, (len(origin),) + d.shape)
+        o = np.broadcast_to(origin[:, None, :], d.shape)
+
+        hits = _ray_hits(o, d, self.bottom, self.top)
+        if skip is not None:
+            hits[np.arange(len(origin)), :, skip] = np.inf
+        t_row = hits.min(axis=-1)
+        with np.errstate(divide="ignore"):
+            t_ground = np.where(d[..., 1] < 0, -o[..., 1] / d[..., 1], np.inf)
+        down = np.isfinite(t_ground) & (t_ground < t_row)
+        sky = ~np.isfinite(t_ground) & ~np.isfinite(t_row)
+
+        x = np.where(down, o[..., 0] + t_ground * d[..., 0], np.nan)
+        cell = np.searchsorted(self.edges, x) - 1
+        inside = down & (cell >= 0) & (cell < len(self.centers))
+        w = np.broadcast_to(weight, d.shape[:-1])
+
+        to_cells = np.zeros((len(origin), len(self.centers)))
+        p = np.broadcast_to(np.arange(len(origin))[:, None], d.shape[:-1])
+        np.add.at(to_cells, (p[inside], cell[inside]), w[inside])
+        return to_cells, (w * (down & ~inside)).sum(axis=1), (w * sky).sum(axis=1)
+
+    def view_factors(self):
+        """Rear -> ground cells / open ground / sky of each row, ground cells -> sky."""
+        s = (np.arange(N_POINTS) + 0.5) / N_POINTS * self.length
+        vf_cells, vf_open, vf_sky = [], [], []
+        for r in range(self.n_rows):
+            pts = self.bottom[r] + s[:, None] * self.tangent
+            c, o, k = self._cast(pts, self.rear, skip=r)
+            vf_cells.append(c.mean(axis=0))
+            vf_open.append(o.mean())
+            vf_sky.append(k.mean())
+        self.vf_cells = np.array(vf_cells)  # (R, C)
+        self.vf_open = np.array(vf_open)    # (R,)
+        self.vf_sky = np.array(vf_sky)      # (R,)
+
+        ground = np.stack([self.centers, np.zeros(len(self.centers))], axis=1)
+        self.ground_sky = self._cast(ground, np.array([0., 1.]))[2] # (C,)
+
+    def profile(self, sun):
+        """Sun vectors (T, 3) in the cross-section plane, (T, 2)."""
+        pa = d2r(self.azimuth)
+        back = np.array([np.sin(pa), np.cos(pa), 0.]) # horizontal, toward the back of the rows
+        return np.stack([sun @ back, sun[:, 2]], axis=1)
+
+    def ground_shade(self, sun2):
+        """Shaded mask (T, C) of the ground cells for 2D sun vectors `sun2` (T, 2), sun up."""
+        k = sun2[:, 0] / sun2[:, 1]
+        a = self.bottom[None, :, 0] - self.bottom[None, :, 1] * k[:, None]
+        b = self.top[None, :, 0] - self.top[None, :, 1] * k[:, None]
+        lo, hi = np.minimum(a, b), np.maximum(a, b)
+        i0 = np.searchsorted(self.centers, lo)
+        i1 = np.searchsorted(self.centers, hi)
+
+        # Number of shadows covering each cell, by a difference array per timestep
+        n = len(self.centers) + 1
+        t = np.arange(len(sun2))[:, None] * n
+        count = np.bincount((t + i0).ravel(), minlength=len(sun2) * n)
+        count -= np.bincount((t + i1).ravel(), minlength=len(sun2) * n)
+        return count.reshape(len(sun2), n).cumsum(axis=1)[:, :-1] > 0
+
+    def irradiance(self, sun, dni, dhi, albedo=0.25, chunk=2048):
+        """
+        Front and rear irradiance (W/m², arrays (T, R)) for sun vectors `sun` (T, 3)
+        and the DNI / DHI (T,). Rows are unshaded on their front (see `shading.py`).
+        """
+        sun2 = self.profile(sun)
+        ghi = dni * sun[:, 2].clip(0) + dhi
+        cb = np.cos(d2r(self.tilt))
+
+        front_normal = np.array([-self.rear[0], -self.rear[1]])
+        cos_front = (sun2 @ front_normal).clip(0)
+        cos_rear = (sun2 @ self.rear).clip(0)
+        front = dni * cos_front + dhi * (1 + cb) / 2 + albedo * ghi * (1 - cb) / 2
+
+        rear = np.zeros((len(sun), self.n_rows))
+        up = np.flatnonzero(sun[:, 2] > 0)
+        for i in range(0, len(up), chunk):
+            idx = up[i:i + chunk]
+            shade = self.ground_shade(sun2[idx])
+            e_ground = (dni[idx, None] * sun[idx, 2, None]) * ~shade + dhi[idx, None] * self.ground_sky
+            rear[idx] = albedo * (e_ground @ self.vf_cells.T + ghi[idx, None] * self.vf_open)
+        rear += dhi[:, None] * self.vf_sky + (dni * cos_rear)[:, None]
+        return np.broadcast_to(front[:, None], rear.shape), rear
+
+
+def bifacial_gain(lat, rows, albedo=0.25, bifaciality=0.7, n_hour=48):
+    """Yearly rear / front energy ratio of each row, times the `bifaciality`, clear sky."""
+    path = SunPath(lat, DAYS, n_hour)
+    sun = sun_vector(path.alpha, path.azimuth).reshape(-1, 3)
+    dni = clear_sky_dni(path.sin_alpha).ravel()
+    dhi = clear_sky_dhi(dni, np.repeat(path.days, path.n_hour))
+    front, rear = rows.irradiance(sun, dni, dhi, albedo)
+    return bifaciality * rear.sum(axis=0) / front.sum(axis=0)
+
+
+if __name__ == "__main__":
+
+    t = time.perf_counter()
+    rows = Rows(n_rows=20, pitch=5., length=2., tilt=25., height=1.)
+    t_vf = time.perf_counter() - t
+
+    t = time.perf_counter()
+    gain = bifacial_gain(50, rows)
+    t_year = time.perf_counter() - t
+
+    print("View factors in {:.2f} s, a year ({} timesteps x {} rows) in {:.2f} s".format(
+        t_vf, 365 * 48, rows.n_rows, t_year))
+    print("Rear view factors, row 0: ground {:.2f}, open ground {:.2f}, sky {:.2f}".format(
+        rows.vf_cells[0].sum(), rows.vf_open[0], rows.vf_sky[0]))
+    print("Bifacial gain per row (%):", " ".join("{:.1f}".format(100 * g) for g in gain))
@@ -0,0 +1,153 @@
+"""
+Incremental build of the figures of `html/`.
+
+Each figure script (a script calling `output_file("../html/...")`) is only run
+again when its key changed. The key is a hash of:
+
+    - the script source and the source of the local modules it imports,
+      recursively (`yield_kernel.py`, `profiling.py`...),
+    - its parameters: command line arguments and the environment variables
+      read by the scripts (`SOLAR_BACKEND`...), the numpy and bokeh versions.
+
+The keys of the last successful builds are stored in `../html/.build_state.json`.
+Stale figures are built in parallel, and the build time of each one is printed.
+
+Usage:
+
+    python3 build_figures.py [-jN] [--force] [--dry-run] [script.py ...]
+"""
+
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from local_imports import dependencies
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HTML = os.path.join(HERE, "..", "html")
+STATE = os.path.join(HTML, ".build_state.json")
+ENV_PARAMS = ("SOLAR_BACKEND",)
+
+OUTPUT = re.compile(r"""output_file\(\s*["']\.\./html/([^"']+)["']""")
+
+
+def figures():
+    """{script: output html} of the figure scripts."""
+    res = {}
+    for name in sorted(os.listdir(HERE)):
+        if name.endswith(".py") and name != os.path.basename(__file__):
+            with open(os.path.join(HERE, name)) as fp:
+                m = OUTPUT.search(fp.read())
+            if m:
+                res[name] = m.group(1)
+    return res
+
+
+def _versions():
+    code = "import numpy, bokeh; print(numpy.__version__, bokeh.__version__)"
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True).stdout.strip()
+
+
+def build_key(script, args=(), versions=""):
+    h = hashlib.sha256()
+    for name in dependencies(script):
+        with open(os.path.join(HERE, name), "rb") as fp:
+            h.update(name.encode() + hashlib.sha256(fp.read()).digest())
+    params = {"args": list(args), "env": {k: os.environ.get(k) for k in ENV_PARAMS}, "versions": versions}
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def load_state():
+    if os.path.exists(STATE):
+        with open(STATE) as fp:
+            return json.load(fp)
+    return {}
+
+
+def save_state(state):
+    with open(STATE, "w") as fp:
+        json.dump(state, fp, indent=1, sort_keys=True)
+
+
+def stale(scripts, state, force=False, args=(), versions=""):
+    """{script: key} of the figures to build."""
+    out = figures()
+    res = {}
+    for script in scripts:
+        key = build_key(script, args, versions)
+        missing = not os.path.exists(os.path.join(HTML, out[script]))
+        if force or missing or state.get(script, {}).get("key") != key:
+            res[script] = key
+    return res
+
+
+def run(script, args=()):
+    """Run one figure script (the browser is not opened). Return (seconds, error or None)."""
+    env = dict(os.environ, BOKEH_BROWSER="none")
+    t = time.perf_counter()
+    p = subprocess.run([sys.executable, script] + list(args), cwd=HERE, env=env,
+                       capture_output=True, text=True)
+    return time.perf_counter() - t, (p.stderr.strip().splitlines() or ["failed"])[-1] if p.returncode else None
+
+
+def build(scripts=None, jobs=None, force=False, dry_run=False, args=()):
+    """
+    Build the stale figures among `scripts` (all by default). Return {script: (seconds, error)}.
+    Raise ValueError when a name is not a figure script of this folder.
+    """
+    figs = figures()
+    unknown = [s for s in scripts or () if s not in figs]
+    if unknown:
+        raise ValueError("Not a figure script: {}. Choose among: {}".format(
+            ", ".join(unknown), ", ".join(figs)))
+    scripts = scripts or list(figs)
+    state = load_state()
+    versions = _versions()
+    todo = stale(scripts, state, force, args, versions)
+    if dry_run or not todo:
+        return {s: None for s in todo}
+
+    res = {}
+    with ThreadPoolExecutor(jobs or os.cpu_count()) as pool:
+        futures = {s: pool.submit(run, s, args) for s in todo}
+        for script, fut in futures.items():
+            elapsed, err = fut.result()
+            res[script] = (elapsed, err)
+            if err is None:
+                state[script] = {"key": todo[script], "seconds": round(elapsed, 3)}
+                save_state(state)
+    return res
+
+
+if __name__ == "__main__":
+
+    argv = sys.argv[1:]
+    jobs = None
+    for a in list(argv):
+        if a.startswith("-j"):
+            argv.remove(a)
+            jobs = int(a[2:])
+    force = "--force" in argv
+    dry_run = "--dry-run" in argv
+    scripts = [a for a in argv if not a.startswith("--")]
+
+    t = time.perf_counter()
+    try:
+        res = build(scripts, jobs, force, dry_run)
+    except ValueError as e:
+        sys.exit(str(e))
+    for script, r in res.items():
+        if r is None:
+            print("{:28s} stale".format(script))
+        else:
+            print("{:28s} {:6.2f} s {}".format(script, r[0], "FAILED: " + r[1] if r[1] else ""))
+    print("{} figure(s) {}, {} up to date, in {:.2f} s".format(
+        len(res), "to rebuild" if dry_run else "rebuilt", len(scripts or figures()) - len(res),
+        time.perf_counter() - t))
+    sys.exit(1 if any(r and r[1] for r in res.values()) else 0)
@@ -0,0 +1,166 @@
+"""
+Level of detail for long series in the figures.
+
+Sending every sample to a `ColumnDataSource` makes large `.html` files and slow
+pages. These functions choose which samples to keep, at most `max_points` per
+glyph, while keeping the peaks:
+
+    - "lttb":   Largest Triangle Three Buckets, keeps the visual shape of the curve;
+    - "minmax": min and max of each bucket (one bucket per pair of points),
+                every extremum is kept.
+
+They return indices, so all the columns of a source (x, y, hover fields) are
+selected together. NaN gaps (night...) are kept as a single NaN between segments.
+
+    idx = select(x, y, 500)
+    source = ColumnDataSource(data=dict(x=x[idx], y=y[idx], t=t[idx]))
+
+Under a Bokeh server, `reload_on_zoom` resamples the visible range at full
+resolution each time the x range changes.
+"""
+
+import numpy as np
+
+MAX_POINTS = 1000
+METHODS = ("lttb", "minmax")
+
+
+def lttb_indices(x, y, n_out):
+    """Indices of the `n_out` points kept by LTTB (finite `x` / `y`, `x` increasing)."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n) if n_out >= n else np.unique([0, n - 1])[:max(n_out, 0)]
+
+    # Bucket edges: first and last points are kept alone
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    idx = np.empty(n_out, dtype=int)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean() # average of the next bucket
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+
+def minmax_indices(y, n_out):
+    """Indices of the min and max of `(n_out - 2) // 2` buckets and of the end points, in order (finite `y`)."""
+    n = len(y)
+    n_bucket = (n_out - 2) // 2 # the first and last points are added
+    if n_out >= n:
+        return np.arange(n)
+    if n_bucket < 1:
+        return np.unique([0, n - 1])[:max(n_out, 0)]
+
+    size = -(-n // n_bucket)
+    padded = np.concatenate([y, np.full(size * n_bucket - n, y[-1])]).reshape(n_bucket, size)
+    base = np.arange(n_bucket)[:, None] * size
+    idx = np.concatenate([base + padded.argmin(axis=1)[:, None], base + padded.argmax(axis=1)[:, None]], axis=1)
+    idx = np.unique(np.minimum(idx, n - 1))
+    return np.union1d(idx, [0, n - 1])
+
+
+def select(x, y, max_points=MAX_POINTS, method="lttb"):
+    """
+    Indices of at most `max_points` samples of the series (`x` increasing).
+    The finite segments share the points according to their length, and each keeps
+    its end points, min and max; when there are more than `(max_points - 1) // 5` of
+    them, neighbouring segments are merged.
+    """
+    if method not in METHODS:
+        raise ValueError("Unknown method {}, choose among {}".format(method, METHODS))
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(y) <= max_points:
+        return np.arange(len(y))
+
+    ok = np.isfinite(x) & np.isfinite(y)
+    # Start / end of the finite runs
+    d = np.diff(np.concatenate([[0], ok.astype(np.int8), [0]]))
+    starts, ends = np.flatnonzero(d == 1), np.flatnonzero(d == -1)
+    if len(starts) == 0:
+        return np.arange(min(len(y), 1))
+
+    # Too many gaps for the budget: neighbouring segments are merged, their inner gaps dropped
+    n_group = min(len(starts), max((max_points - 1) // 5, 1))
+    group = np.arange(len(starts)) * n_group // len(starts)
+    last = np.flatnonzero(np.diff(np.concatenate([group, [n_group]])))
+    first = np.concatenate([[0], last[:-1] + 1])
+    starts, ends = starts[first], ends[last]
+
+    # One NaN after each segment, the first sample if it is NaN; 4 points at least per segment
+    budget = max(max_points - 1 - 5 * n_group, 0)
+    count = np.concatenate([[0], np.cumsum(ok)])
+    lengths = count[ends] - count[starts]
+    share = 4 + (budget * lengths / lengths.sum()).astype(int)
+
+    parts = []
+    for s, e, k in zip(starts, ends, share):
+        rows = s + np.flatnonzero(ok[s:e])
+        if method == "lttb":
+            # The extrema of the segment are kept whatever the shape
+            yr = y[rows]
+            sub = np.union1d(lttb_indices(x[rows], yr, k - 2), [np.argmin(yr), np.argmax(yr)])
+        else:
+            sub = minmax_indices(y[rows], k)
+        parts.append(rows[sub])
+        if e < len(y):
+            parts.append([e]) # first sample of the gap
+    idx = np.concatenate(parts).astype(int)
+    if starts[0] > 0:
+        idx = np.concatenate([[0], idx])
+    return idx
+
+
+def reload_on_zoom(fig, source, columns, max_points=MAX_POINTS, method="lttb"):
+    """
+    Under a Bokeh server: when the x range of `fig` changes, fill `source` with the
+    samples of the visible range of `columns` (dict of full resolution arrays,
+    with "x" and "y"), downsampled to `max_points`. Does nothing in a static file.
+    """
+    from bokeh.io import curdoc
+
+    if curdoc().session_context is None:
+        return False
+
+    x = np.asarray(columns["x"])
+
+    def update(attr, old, new):
+        lo, hi = np.searchsorted(x, [fig.x_range.start, fig.x_range.end])
+        lo, hi = max(lo - 1, 0), min(hi + 1, len(x))
+        idx = lo + select(x[lo:hi], np.asarray(columns["y"])[lo:hi], max_points, method)
+        source.data = {k: np.asarray(v)[idx] for k, v in columns.items()}
+
+    fig.x_range.on_change("start", update)
+    fig.x_range.on_change("end", update)
+    return True
+
+
+if __name__ == "__main__":
+
+    import time
+
+    # One year of minute samples: daily cycle + noise + a few spikes
+    t = np.arange(365 * 1440) / 1440
+    rng = np.random.default_rng(0)
+    y = np.sin(2 * np.pi * t).clip(0) + 0.05 * rng.standard_normal(len(t))
+    y[rng.integers(0, len(t), 5)] += 3
+    y[np.sin(2 * np.pi * t) < -0.5] = np.nan
+
+    # One year of hourly samples: a NaN gap each night, more segments than the budget
+    th = np.arange(365 * 24) / 24
+    yh = np.sin(2 * np.pi * th).clip(0) * (0.8 + 0.2 * rng.random(len(th)))
+    yh[np.sin(2 * np.pi * th) <= 0] = np.nan
+    yh[len(th) // 3 + 12] = 5
+
+    for name, tt, yy, n_out in (("minute", t, y, 2000), ("hourly", th, yh, MAX_POINTS)):
+        for method in METHODS:
+            start = time.perf_counter()
+            idx = select(tt, yy, n_out, method)
+            elapsed = time.perf_counter() - start
+            kept = np.nanmax(yy[idx]) == np.nanmax(yy)
+            print("{} {:6s}: {} -> {} points (max {}) in {:.0f} ms, max kept: {}".format(
+                name, method, len(tt), len(idx), n_out, 1000 * elapsed, kept))
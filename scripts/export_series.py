@@ -0,0 +1,149 @@
+"""
+Export of time-indexed sun elevation and yield series to Parquet / Arrow.
+
+For each site of a table (see `batch_yield.py`, an optional `lon` column is used
+when present, else 0) and each year, hourly rows:
+
+    site (dictionary-encoded id), time (UTC), elevation (degree), yield (kWh)
+
+The yield is the beam on the panel times its capacity, as in `batch_yield.py`
+(1000 W/m² beam, no atmosphere). The sun position is the "fast" mode of
+`sun_position.py` by default, so the leap years are handled.
+
+The series are written block by block (a group of sites, one year), each block
+being a row group of the Parquet file or a record batch of the Arrow IPC file:
+the whole output is never built in memory. Values are float32.
+
+`read_series` maps an Arrow IPC file (`.arrow`) in memory, without copy.
+Parquet files are smaller (zstd) but decoded when read, and store the times in ms.
+
+pyarrow is optional: it is only needed by this module.
+
+Usage:
+
+    python3 export_series.py out.parquet|out.arrow [sites.csv] [first_year last_year]
+"""
+
+import importlib.util
+import sys
+import time
+
+import numpy as np
+
+from batch_yield import load_sites, random_sites
+from sun_position import d2r, solar_position
+
+HAVE_ARROW = importlib.util.find_spec("pyarrow") is not None
+
+ROW_GROUP = 2**20 # rows per block
+
+
+def _arrow():
+    if not HAVE_ARROW:
+        raise ImportError("The Parquet / Arrow export requires pyarrow (pip install pyarrow).")
+    import pyarrow
+    return pyarrow
+
+
+def schema():
+    pa = _arrow()
+    return pa.schema([
+        ("site", pa.dictionary(pa.int32(), pa.int64())),
+        ("time", pa.timestamp("s", tz="UTC")),
+        ("elevation", pa.float32()),
+        ("yield", pa.float32()),
+    ])
+
+
+def year_times(year, step=3600):
+    """Timestamps (UTC, datetime64[s]) of a year, every `step` seconds."""
+    start = np.datetime64("{}-01-01".format(year), "s")
+    end = np.datetime64("{}-01-01".format(year + 1), "s")
+    return np.arange(start, end, np.timedelta64(step, "s"))
+
+
+def site_series(sites, times, mode="fast"):
+    """Elevation (degree) and yield (kWh per step) arrays (S, T) of `sites` at `times`."""
+    lon = sites["lon"] if "lon" in sites.dtype.names else np.zeros(len(sites))
+    pos = solar_position(times[None, :], sites["lat"][:, None], lon[:, None], mode=mode)
+    elev = d2r(pos["elevation"])
+    az = d2r(pos["azimuth"] - 180) # from south, positive west
+    tilt = d2r(sites["tilt"])[:, None]
+    pa = d2r(sites["azimuth"])[:, None]
+
+    c = np.sin(elev) * np.cos(tilt) + np.cos(elev) * np.sin(tilt) * np.cos(az - pa)
+    c = np.where(elev > 0, c.clip(0), 0.)
+    step = (times[1] - times[0]) / np.timedelta64(1, "h") if len(times) > 1 else 1.
+    return pos["elevation"], c * sites["capacity"][:, None] * step
+
+
+def iter_batches(sites, years, step=3600, mode="fast", row_group=ROW_GROUP):
+    """Record batches of the series, one per (group of sites, year), about `row_group` rows each."""
+    pa = _arrow()
+    ids = pa.array(np.asarray(sites["id"], dtype=np.int64))
+    for year in years:
+        times = year_times(year, step)
+        block = max(1, row_group // len(times))
+        for s in range(0, len(sites), block):
+            sub = sites[s:s + block]
+            elev, y = site_series(sub, times, mode)
+            n = len(sub)
+            site = pa.DictionaryArray.from_arrays(
+                np.repeat(np.arange(s, s + n, dtype=np.int32), len(times)), ids)
+            yield pa.record_batch([
+                site,
+                pa.array(np.tile(times, n)).cast(pa.timestamp("s", tz="UTC")),
+                pa.array(elev.astype(np.float32).ravel()),
+                pa.array(y.astype(np.float32).ravel()),
+            ], schema=schema())
+
+
+def export_series(path, sites, years, step=3600, mode="fast", row_group=ROW_GROUP):
+    """Stream the series to `path` (`.parquet`, else Arrow IPC file). Return the number of rows."""
+    pa = _arrow()
+    rows = 0
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        with pq.ParquetWriter(path, schema(), compression="zstd") as writer:
+            for batch in iter_batches(sites, years, step, mode, row_group):
+                writer.write_table(pa.Table.from_batches([batch]), row_group_size=len(batch))
+                rows += len(batch)
+    else:
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, schema()) as writer:
+            for batch in iter_batches(sites, years, step, mode, row_group):
+                writer.write_batch(batch)
+                rows += len(batch)
+    return rows
+
+
+def read_series(path, columns=None):
+    """Read an export back as a `pyarrow.Table` (memory-mapped, zero-copy for Arrow IPC files)."""
+    pa = _arrow()
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=columns, memory_map=True)
+        if "site" in table.column_names: # Parquet gives the integer ids back decoded
+            i = table.column_names.index("site")
+            table = table.set_column(i, "site", table["site"].dictionary_encode())
+        return table
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return table.select(columns) if columns else table
+
+
+if __name__ == "__main__":
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "series.parquet"
+    sites = load_sites(sys.argv[2]) if len(sys.argv) > 2 else random_sites(200)
+    years = range(int(sys.argv[3]), int(sys.argv[4]) + 1) if len(sys.argv) > 4 else [2023, 2024]
+
+    t = time.perf_counter()
+    rows = export_series(path, sites, years)
+    t_write = time.perf_counter() - t
+
+    t = time.perf_counter()
+    table = read_series(path)
+    t_read = time.perf_counter() - t
+
+    print("{} sites x {} years: {} rows written in {:.2f} s, read in {:.3f} s".format(
+        len(sites), len(years), rows, t_write, t_read))
+    print(table.schema)
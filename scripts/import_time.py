@@ -0,0 +1,79 @@
+"""
+Cold-start import time of the compute modules.
+
+Each module is imported in a fresh interpreter, so nothing is already loaded.
+The compute modules must not pull bokeh in: the figure scripts only import it
+in their `__main__` block, when a figure is actually drawn.
+
+Usage:
+
+    python3 import_time.py [--record]
+
+`--record` appends the measures to `../import_times.csv` to track them over time.
+The exit code is 1 if a compute module imports bokeh.
+"""
+
+import datetime
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RECORD = os.path.join(HERE, "..", "import_times.csv")
+
+COMPUTE = ["yield_kernel", "sun_position", "tracker", "result_cache", "local_imports", "profiling", "jit_backend",
+           "batch_yield", "monte_carlo", "yield_year", "yield_day_tot_fixed", "yield_cube", "tilt_schedule",
+           "export_series", "yield_service", "pv_power",
+           "shading", "downsample", "roof_layout",
+           "bifacial", "transposition", "self_consumption",
+           "sky_histogram", "terrain_horizon"]
+REFERENCE = ["numpy", "bokeh.plotting"]
+
+CODE = """
+import sys, time
+t = time.perf_counter()
+import {}
+print(time.perf_counter() - t, "bokeh" in sys.modules)
+"""
+
+
+def measure(module, repeat=5):
+    """Best cold import time (s) of `module` over `repeat` fresh interpreters, and whether bokeh got loaded."""
+    best = float("inf")
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", CODE.format(module)], cwd=HERE,
+                             capture_output=True, text=True, check=True).stdout.split()
+        best = min(best, float(out[0]))
+    return best, out[1] == "True"
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+if __name__ == "__main__":
+
+    rows = []
+    leak = False
+    for module in COMPUTE + REFERENCE:
+        t, bokeh = measure(module)
+        rows.append((module, t))
+        if module in COMPUTE and bokeh:
+            leak = True
+        print("{:24s} {:8.1f} ms {}".format(module, 1000 * t, "(imports bokeh)" if bokeh else ""))
+
+    if "--record" in sys.argv:
+        new = not os.path.exists(RECORD)
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        rev = git_revision()
+        with open(RECORD, "a") as fp:
+            if new:
+                fp.write("date,revision,module,seconds\n")
+            for module, t in rows:
+                fp.write("{},{},{},{:.5f}\n".format(now, rev, module, t))
+
+    sys.exit(1 if leak else 0)
@@ -0,0 +1,267 @@
+"""
+Optional JIT (numba) versions of the loop-shaped kernels.
+
+    - `yearly_yield`:    365 days x hours x tilts accumulation of `yield_year.py`,
+                         parallel over the days (`prange`), one partial sum per day.
+    - `day_yield_fixed`: per-tilt loop of `yield_day_tot_fixed.py`, parallel over the tilts.
+    - `battery_dispatch`: state of charge loop of `self_consumption.py`, parallel over the households.
+    - `segment_best`, `schedule_step`: tables and dynamic programming step of `tilt_schedule.py`,
+                         parallel over the segment starts / ends.
+
+They run in loops, so no (days x hours x tilts) temporary is ever built.
+
+The backend is chosen at runtime: `"auto"` (numba when installed), `"numba"` or `"numpy"`,
+or with the `SOLAR_BACKEND` environment variable. Without numba, everything falls back
+to the NumPy code of the scripts.
+
+Run this file to check the parity of both backends and compare their run times.
+"""
+
+import importlib.util
+import math
+import os
+import time
+
+import numpy as np
+
+# numba is only imported (and the kernels compiled) on first use, to keep imports fast
+HAVE_NUMBA = importlib.util.find_spec("numba") is not None
+prange = range
+_compiled = {}
+
+BACKENDS = ("auto", "numba", "numpy")
+
+
+def resolve(backend=None):
+    """Backend actually used for `backend` ("auto", "numba", "numpy" or None for `$SOLAR_BACKEND`)."""
+    if backend is None:
+        backend = os.environ.get("SOLAR_BACKEND", "auto")
+    if backend not in BACKENDS:
+        raise ValueError("Unknown backend {}, choose among {}".format(backend, BACKENDS))
+    if backend == "auto":
+        return "numba" if HAVE_NUMBA else "numpy"
+    if backend == "numba" and not HAVE_NUMBA:
+        raise ImportError("The numba backend was requested but numba is not installed.")
+    return backend
+
+
+def use_jit(backend=None):
+    return resolve(backend) == "numba"
+
+
+def _jit(func):
+    """Compiled version of `func`, `prange` being numba's one."""
+    global prange
+    if func.__name__ not in _compiled:
+        import numba
+        prange = numba.prange
+        _compiled[func.__name__] = numba.njit(parallel=True, cache=True, error_model="numpy")(func)
+    return _compiled[func.__name__]
+
+
+def _yearly_yield(lat0, beta_range, hra):
+    n_beta = beta_range.shape[0]
+    partial = np.zeros((365, n_beta))
+    L = lat0 * math.pi / 180
+
+    for N in prange(365):
+        gamma = 23.433333 * math.pi / 180 * math.sin(2 * math.pi * (N + 284) / 365)
+        A = math.sin(gamma) * math.sin(L)
+        B = math.cos(gamma) * math.cos(L)
+        for i in range(hra.shape[0]):
+            a = math.asin(A + B * math.cos(hra[i]))
+            if a >= 0:
+                for j in range(n_beta):
+                    v = math.sin(beta_range[j] * math.pi / 180 + a)
+                    if v > 0:
+                        partial[N, j] += v
+
+    return partial.sum(axis=0) / (hra.shape[0] * 365) * 2 * 100
+
+
+def _day_yield_fixed(lat0, day0, beta, hra):
+    gamma = 23.433333 * math.pi / 180 * math.sin(2 * math.pi * (day0 + 284) / 365)
+    L = lat0 * math.pi / 180
+    A = math.sin(gamma) * math.sin(L)
+    B = math.cos(gamma) * math.cos(L)
+    vals = np.zeros(beta.shape[0])
+
+    for k in prange(beta.shape[0]):
+        cb = math.cos(beta[k] * math.pi / 180)
+        sb = math.sin(beta[k] * math.pi / 180)
+        s = 0.
+        for j in range(hra.shape[0]):
+            alpha = math.asin(A + B * math.cos(hra[j]))
+            if alpha >= 0:
+                TA = math.tan(alpha)
+                SH = math.sin(hra[j])
+                Y = sb * TA - cb * math.cos(hra[j])
+                X = 1 + TA**2
+
+                V_A = math.sqrt(1 - SH**2/X)
+                V_B = math.sqrt(1 - Y**2/X)
+                V_AB = Y*SH/X
+
+                s += math.sqrt(1 - (V_AB / (V_A * V_B))**2) * V_B * V_A
+        vals[k] = 100 * s / hra.shape[0]
+    return vals
+
+
+def _battery_dispatch(pv, load, kwp, capacity, power, eta, dt, soc, totals):
+    k_in = eta * dt   # kWh stored per kW charged
+    k_out = dt / eta  # kWh drawn per kW discharged
+    for h in prange(load.shape[0]):
+        s = soc[h]
+        cap = capacity[h]
+        p_max = power[h]
+        e_pv = e_load = e_import = e_export = e_charge = e_discharge = 0.
+        for t in range(load.shape[1]):
+            p = pv[t] * kwp[h]
+            net = p - load[h, t]
+            e_pv += p
+            e_load += load[h, t]
+            if net > 0:
+                c = min(net, p_max)
+                if c * k_in > cap - s:
+                    c = max(cap - s, 0.) / k_in
+                s += c * k_in
+                e_charge += c
+                e_export += net - c
+            else:
+                d = min(-net, p_max)
+                if d * k_out > s:
+                    d = max(s, 0.) / k_out
+                s -= d * k_out
+                e_discharge += d
+                e_import += -net - d
+        soc[h] = s
+        totals[h, 0] += e_pv * dt
+        totals[h, 1] += e_load * dt
+        totals[h, 2] += e_import * dt
+        totals[h, 3] += e_export * dt
+        totals[h, 4] += e_charge * dt
+        totals[h, 5] += e_discharge * dt
+
+
+def _segment_best(P, best, best_t, wrap_t):
+    n, n_tilt = P.shape
+    for i in prange(n):
+        for j in range(i, n):
+            v_best, t_best = -np.inf, 0
+            v_wrap, t_wrap = -np.inf, 0
+            for t in range(n_tilt):
+                seg = P[j, t] - P[i, t]
+                if seg > v_best:
+                    v_best, t_best = seg, t
+                w = P[n - 1, t] - seg
+                if w > v_wrap:
+                    v_wrap, t_wrap = w, t
+            if j > i:
+                best[i, j] = v_best
+                best_t[i, j] = t_best
+            wrap_t[i, j] = t_wrap
+
+
+def _schedule_step(f_t, best_t, new, arg):
+    # Transposed inputs: the loop over i reads contiguous memory
+    n_c, n = f_t.shape
+    for j in prange(1, n):
+        for c in range(n_c):
+            v, a = -np.inf, 0
+            for i in range(j):
+                x = f_t[c, i] + best_t[j, i]
+                if x > v:
+                    v, a = x, i
+            new[j, c] = v
+            arg[j, c] = a
+
+
+def yearly_yield(lat0, beta_range, hra):
+    """JIT version of `yield_year.yearly_yield`."""
+    return _jit(_yearly_yield)(float(lat0), np.asarray(beta_range, dtype=float),
+                               np.asarray(hra, dtype=float))
+
+
+def day_yield_fixed(lat0, day0, beta, hra):
+    """JIT version of `yield_day_tot_fixed.day_yield_fixed` (hour angles given explicitly)."""
+    return _jit(_day_yield_fixed)(float(lat0), float(day0), np.asarray(beta, dtype=float),
+                                  np.asarray(hra, dtype=float))
+
+
+def battery_dispatch(pv, load, kwp, capacity, power, eta, dt, soc, totals):
+    """JIT version of `self_consumption.dispatch_numpy` (`soc` and `totals` updated in place)."""
+    _jit(_battery_dispatch)(pv, load, kwp, capacity, power, float(eta), float(dt), soc, totals)
+
+
+def segment_best(P):
+    """JIT version of the segment tables of `tilt_schedule.optimize`: best, best_t, wrap_t."""
+    n = P.shape[0]
+    best = np.full((n, n), -np.inf)
+    best_t = np.zeros((n, n), dtype=np.int64)
+    wrap_t = np.full((n, n), -1, dtype=np.int64)
+    _jit(_segment_best)(np.ascontiguousarray(P, dtype=float), best, best_t, wrap_t)
+    return best, best_t, wrap_t
+
+
+def schedule_step(f, best_t):
+    """
+    JIT version of one dynamic programming step of `tilt_schedule.optimize` (`best_t`:
+    the transposed, contiguous `best` table): new f, argmax.
+    """
+    new = np.full(f.shape, -np.inf)
+    arg = np.zeros(f.shape, dtype=np.int64)
+    _jit(_schedule_step)(np.ascontiguousarray(f.T), best_t, new, arg)
+    return new, arg
+
+
+def _max_diff(new, ref):
+    """Largest absolute difference, inf when the NaN of the two results differ."""
+    if not np.array_equal(np.isnan(new), np.isnan(ref)):
+        return np.inf
+    return np.nanmax(np.abs(new - ref), initial=0.)
+
+
+def parity_check(lats=(0, 23, 50, 70), days=(0, 80, 172, 300)):
+    """Largest absolute difference (%) between the numba and numpy backends of each kernel."""
+    import yield_year
+    import yield_day_tot_fixed
+
+    hra = yield_year.d2r(15 * (np.linspace(0, 24, 200) - 12))
+    err = {"yearly_yield": 0., "day_yield_fixed": 0.}
+    for lat in lats:
+        beta = np.arange(90)
+        ref = yield_year.yearly_yield(lat, beta, hra, backend="numpy")
+        err["yearly_yield"] = max(err["yearly_yield"], _max_diff(yearly_yield(lat, beta, hra), ref))
+
+        beta = np.linspace(0, 90, 200)
+        for day in days:
+            ref = yield_day_tot_fixed.day_yield_fixed(lat, day, beta, backend="numpy")
+            new = day_yield_fixed(lat, day, beta, hra)
+            err["day_yield_fixed"] = max(err["day_yield_fixed"], _max_diff(new, ref))
+    return err
+
+
+if __name__ == "__main__":
+
+    import yield_year
+    import yield_day_tot_fixed
+
+    print("numba available: {}, backend used: {}".format(HAVE_NUMBA, resolve()))
+    if not HAVE_NUMBA:
+        raise SystemExit(0)
+
+    for name, e in parity_check().items():
+        print("parity {:16s} max abs diff {:.2e} %".format(name, e))
+
+    hra = yield_year.d2r(15 * (np.linspace(0, 24, 200) - 12))
+    runs = {
+        "yearly_yield": lambda b: yield_year.yearly_yield(50, np.arange(90), hra, backend=b),
+        "day_yield_fixed": lambda b: yield_day_tot_fixed.day_yield_fixed(
+            50, 30, np.linspace(0, 90, 200), backend=b),
+    }
+    for name, run in runs.items():
+        for b in ("numpy", "numba"):
+            run(b) # warm-up / compilation
+            t = time.perf_counter()
+            run(b)
+            print("{:16s} {:6s} {:8.2f} ms".format(name, b, 1000 * (time.perf_counter() - t)))
@@ -0,0 +1,31 @@
+"""
+Local modules imported by a script of this folder, recursively.
+
+Shared by the keys of `build_figures.py` (figure rebuilds) and `result_cache.py`
+(kernel version), so a change in any imported module invalidates both.
+Only the `import x` / `from x import` lines naming a `.py` file of the folder count.
+"""
+
+import os
+import re
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT = re.compile(r"^\s*(?:from\s+(\w+)\s+import|import\s+([\w ,]+))", re.M)
+
+
+def dependencies(script, folder=HERE):
+    """`script` and the local modules it imports, recursively (file names, sorted)."""
+    seen = set()
+    todo = [script]
+    while todo:
+        name = todo.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        with open(os.path.join(folder, name)) as fp:
+            src = fp.read()
+        for m in IMPORT.finditer(src):
+            mods = [m.group(1)] if m.group(1) else [s.split()[0] for s in m.group(2).split(",")]
+            todo += [mod + ".py" for mod in mods if os.path.exists(os.path.join(folder, mod + ".py"))]
+    return sorted(seen)
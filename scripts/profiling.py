@@ -0,0 +1,133 @@
+"""
+Per-stage timing of the scripts.
+
+Run any script with `--profile` (or `--profile=report.json`) to get a JSON
+report with, for each stage: wall time, number of calls and peak memory allocated
+during the stage (traced peak minus the traced memory at its start).
+
+Importing the modules does not enable anything: the scripts call
+`profiler.enable_from_argv()` at the top of their `__main__` block.
+
+Stages used in the scripts:
+
+    - "sun_position": sun angles
+    - "jit_kernel":   numba kernels of `jit_backend.py` (sun angles and yields fused)
+    - "yield_kernel": yield computation
+    - "reduction":    sums / argmax
+    - "bokeh_model":  figure, sources, callbacks
+    - "save":         `output_file` / `show`
+
+Two ways to mark stages:
+
+    with profiler.stage("yield_kernel"):
+        ...
+
+or, to cut a script into consecutive sections, `profiler.start("save")`
+(it ends the previous section). Stages can be nested, times are inclusive.
+
+Memory tracing (`tracemalloc`) slows the run down, so compare stages
+between them rather than with an unprofiled run.
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Profiler:
+
+    def __init__(self, enabled=False, path=None):
+        self.enabled = enabled
+        self.path = path
+        self.stats = {}
+        self._stack = []
+        self._section = None
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def enable_from_argv(self, argv=None):
+        """Enable when `--profile[=path]` is in `argv` (`sys.argv`), and remove the flag so scripts do not see it."""
+        argv = sys.argv if argv is None else argv
+        for arg in list(argv):
+            if arg == "--profile" or arg.startswith("--profile="):
+                argv.remove(arg)
+                self.enabled = True
+                self.path = arg.partition("=")[2] or None
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                break
+        return self
+
+    def _enter(self, name):
+        current, peak = tracemalloc.get_traced_memory()
+        for frame in self._stack:
+            frame["peak"] = max(frame["peak"], peak)
+        tracemalloc.reset_peak()
+        self._stack.append({"name": name, "t": time.perf_counter(), "start": current, "peak": current})
+
+    def _exit(self):
+        frame = self._stack.pop()
+        elapsed = time.perf_counter() - frame["t"]
+        peak = tracemalloc.get_traced_memory()[1]
+        for f in self._stack + [frame]:
+            f["peak"] = max(f["peak"], peak)
+
+        s = self.stats.setdefault(frame["name"], {"calls": 0, "wall_s": 0., "peak_bytes": 0})
+        s["calls"] += 1
+        s["wall_s"] += elapsed
+        s["peak_bytes"] = max(s["peak_bytes"], frame["peak"] - frame["start"])
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def wrap(self, name):
+        """Decorator: run each call of the function in stage `name`."""
+        def deco(func):
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            wrapper.__name__ = func.__name__
+            wrapper.__doc__ = func.__doc__
+            return wrapper
+        return deco
+
+    def start(self, name):
+        """End the current section (if any) and start section `name`."""
+        self.stop()
+        if self.enabled:
+            self._enter(name)
+            self._section = self._stack[-1]
+
+    def stop(self):
+        """End the current section."""
+        if self._section is not None:
+            while self._stack and self._stack[-1] is not self._section:
+                self._exit()
+            self._exit()
+            self._section = None
+
+    def report(self):
+        """End the current section, write / print the JSON report when enabled, and return it."""
+        self.stop()
+        res = {name: dict(s) for name, s in self.stats.items()}
+        if self.enabled:
+            txt = json.dumps(res, indent=2)
+            if self.path:
+                with open(self.path, "w") as fp:
+                    fp.write(txt)
+            else:
+                print(txt)
+        return res
+
+
+profiler = Profiler()
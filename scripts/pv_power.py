@@ -0,0 +1,131 @@
+"""
+PV power model: from the plane-of-array irradiance to the AC power of one system.
+
+    - irradiance: beam on the panel, `dni * cos(incidence)`. Without measured data,
+      the DNI is the clear sky model of PVEducation, `1353 * 0.7 ** (AM ** 0.678)` W/m²,
+      AM being the Kasten - Young air mass.
+    - cell temperature (Faiman): `t_amb + poa / (u0 + u1 * wind)`
+    - DC power: `p_dc0 * poa / 1000 * (1 + gamma * (t_cell - 25))`
+    - AC power: `eta_inv * dc`, clipped at the inverter rating `p_dc0 / dc_ac_ratio`.
+
+Everything is computed in place on (days, steps) arrays, so a full year at one
+minute resolution (525 600 steps) takes a fraction of a second.
+
+Run this file to time it.
+"""
+
+import time
+
+import numpy as np
+
+from yield_kernel import DAYS, SunPath, Workspace, r2d
+
+# Default system: 1 kW of panels (DC), crystalline silicon, free standing rack
+SYSTEM = {
+    "p_dc0": 1.,        # kW, at 1000 W/m² and 25 °C
+    "gamma": -0.004,    # / °C, power temperature coefficient
+    "u0": 25.,          # W/m²/°C, Faiman constant heat loss
+    "u1": 6.84,         # W/m²/°C per m/s, Faiman wind heat loss
+    "dc_ac_ratio": 1.2,
+    "eta_inv": 0.96,
+}
+
+
+def clear_sky_dni(sin_alpha, out=None):
+    """Clear sky direct normal irradiance (W/m²) from the sine of the sun elevation, 0 at night."""
+    up = sin_alpha > 0
+    zenith = 90 - r2d(np.arcsin(sin_alpha.clip(-1, 1)))
+    # Kasten - Young air mass
+    am = np.divide(1, sin_alpha + 0.50572 * np.abs(96.07995 - zenith)**-1.6364, where=up,
+                   out=np.ones_like(sin_alpha))
+    out = np.power(am, 0.678, out=out)
+    np.power(0.7, out, out=out)
+    np.multiply(out, 1353, out=out)
+    np.copyto(out, 0., where=~up)
+    return out
+
+
+def clear_sky_dhi(dni, days):
+    """Clear sky diffuse horizontal irradiance (W/m²), ASHRAE sky diffuse factor times the DNI."""
+    c = 0.095 + 0.04 * np.sin(2 * np.pi * (np.asarray(days) - 100) / 365)
+    return c * dni
+
+
+def synthetic_weather(path):
+    """Ambient temperature (°C) and wind speed (m/s) over a `SunPath`, when no measure is available."""
+    day = path.days[:, None]
+    season = -np.cos(2 * np.pi * (day + 10) / 365) # coldest mid January
+    t_amb = 11 + 9 * season - 4 * path.CH # warmer in the afternoon
+    wind = np.full(path.alpha.shape, 3.)
+    return t_amb, wind
+
+
+def ac_power(poa, t_amb, wind, system=SYSTEM):
+    """
+    DC / AC power (kW) and cell temperature (°C) from the plane-of-array irradiance
+    `poa` (W/m²), the ambient temperature `t_amb` (°C) and the wind speed `wind` (m/s).
+
+    Return a dict of arrays: "t_cell", "dc", "ac" and "clipped" (DC power lost
+    by the inverter clipping, kW).
+    """
+    s = dict(SYSTEM, **system)
+    poa = np.asarray(poa, dtype=float)
+
+    t_cell = np.multiply(wind, s["u1"])
+    t_cell += s["u0"]
+    np.divide(poa, t_cell, out=t_cell)
+    t_cell += t_amb
+
+    dc = np.subtract(t_cell, 25.)
+    dc *= s["gamma"]
+    dc += 1
+    dc *= poa
+    dc *= s["p_dc0"] / 1000
+
+    ac = np.multiply(dc, s["eta_inv"])
+    p_ac0 = s["p_dc0"] / s["dc_ac_ratio"]
+    clipped = np.subtract(ac, p_ac0)
+    clipped.clip(0, out=clipped)
+    clipped /= s["eta_inv"]
+    np.minimum(ac, p_ac0, out=ac)
+    return {"t_cell": t_cell, "dc": dc, "ac": ac, "clipped": clipped}
+
+
+def annual_power(lat, tilt, azimuth=0., t_amb=None, wind=None, step_min=1, dni=None, system=SYSTEM):
+    """
+    AC power of a fixed system over a year, one value every `step_min` minutes (solar time).
+
+    `t_amb`, `wind` and `dni` are (365, steps per day) arrays; synthetic weather
+    and clear sky DNI are used when they are not given.
+    Return the dict of `ac_power`, plus "poa" and the energies (kWh): "ac_kwh",
+    "dc_kwh", "clipped_kwh".
+    """
+    path = SunPath(lat, DAYS, hours=np.arange(0, 24 * 60, step_min) / 60)
+    if t_amb is None or wind is None:
+        t_default, w_default = synthetic_weather(path)
+        t_amb = t_default if t_amb is None else t_amb
+        wind = w_default if wind is None else wind
+
+    poa = path.fixed_into(tilt, azimuth, np.empty(path.alpha.shape), Workspace(path))
+    poa *= clear_sky_dni(path.U) if dni is None else dni
+
+    res = ac_power(poa, t_amb, wind, system)
+    res["poa"] = poa
+    hours = step_min / 60
+    for k in ("ac", "dc", "clipped"):
+        res[k + "_kwh"] = res[k].sum() * hours
+    return res
+
+
+if __name__ == "__main__":
+
+    lat0, tilt, azimuth = 50, 35, 0
+
+    annual_power(lat0, tilt, azimuth) # warm-up
+    t = time.perf_counter()
+    res = annual_power(lat0, tilt, azimuth)
+    elapsed = time.perf_counter() - t
+
+    print("1-minute year ({} steps) in {:.0f} ms".format(res["ac"].size, 1000 * elapsed))
+    print("AC {:.0f} kWh/kWp, DC {:.0f} kWh/kWp, clipping loss {:.1f} kWh, max cell temperature {:.0f} °C".format(
+        res["ac_kwh"], res["dc_kwh"], res["clipped_kwh"], res["t_cell"].max()))
@@ -0,0 +1,171 @@
+"""
+On-disk cache of computed arrays.
+
+A result is stored as a `.npz` file named after a hash of:
+
+    - a name (which computation),
+    - its parameters (numbers, strings, lists, numpy arrays),
+    - the kernel version, i.e. the source of `yield_kernel.py`, of any other
+      file given in `sources` (typically the script itself), and of the local
+      modules they import, recursively (`jit_backend.py`, `pv_power.py`...).
+
+Changing a parameter or the code gives a new key, so stale results are never read.
+When the cache grows above `max_bytes`, the least recently used files are removed.
+
+The cache folder is `../cache/` (next to `html/`), or `$SOLAR_CACHE_DIR`.
+Set `SOLAR_CACHE=0` to disable it.
+"""
+
+import hashlib
+import json
+import os
+import zipfile
+
+import numpy as np
+
+from local_imports import dependencies
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get("SOLAR_CACHE_DIR", os.path.join(HERE, "..", "cache"))
+MAX_BYTES = 512 * 2**20
+
+
+def _file_hash(path):
+    with open(path, "rb") as fp:
+        return hashlib.sha256(fp.read()).hexdigest()
+
+
+def kernel_version(sources=()):
+    """Hash of the kernel source, of the extra `sources` files and of their local imports."""
+    paths = []
+    for s in [os.path.join(HERE, "yield_kernel.py")] + [os.path.abspath(s) for s in sources]:
+        if os.path.samefile(os.path.dirname(s), HERE):
+            paths += [os.path.join(HERE, name) for name in dependencies(os.path.basename(s))]
+        else:
+            paths.append(s)
+    h = hashlib.sha256()
+    for p in sorted(set(paths)):
+        h.update(_file_hash(p).encode())
+    return h.hexdigest()
+
+
+def _jsonable(obj):
+    if isinstance(obj, np.ndarray):
+        return {"dtype": str(obj.dtype), "shape": obj.shape,
+                "sha": hashlib.sha256(np.ascontiguousarray(obj).tobytes()).hexdigest()}
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, dict):
+        return {str(k): _jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_jsonable(v) for v in obj]
+    return obj
+
+
+def make_key(name, params, sources=()):
+    """Content hash of a computation."""
+    desc = {"name": name, "params": _jsonable(params), "version": kernel_version(sources)}
+    return hashlib.sha256(json.dumps(desc, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """Content-addressed `.npz` store with size-based (LRU) eviction."""
+
+    def __init__(self, path=CACHE_DIR, max_bytes=MAX_BYTES, enabled=None):
+        if enabled is None:
+            enabled = os.environ.get("SOLAR_CACHE", "1") != "0"
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    def _file(self, key):
+        return os.path.join(self.path, key + ".npz")
+
+    def get(self, key):
+        """Return the stored dict of arrays, or None."""
+        f = self._file(key)
+        if not self.enabled or not os.path.exists(f):
+            return None
+        try:
+            with np.load(f) as data:
+                res = {k: data[k] for k in data.files}
+        except FileNotFoundError:
+            return None # Evicted by another process meanwhile
+        except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile):
+            # Corrupted / partial file: removed, and recomputed by the caller
+            try:
+                os.remove(f)
+            except FileNotFoundError:
+                pass
+            return None
+        try:
+            os.utime(f) # Mark as recently used
+        except FileNotFoundError:
+            pass # Evicted by another process meanwhile
+        return res
+
+    def put(self, key, arrays):
+        """Store a dict of arrays, then evict old entries if needed."""
+        if not self.enabled:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        # Not ending in `.npz`, so other processes never take it for an entry
+        tmp = "{}.{}.tmp".format(self._file(key), os.getpid())
+        with open(tmp, "wb") as fp:
+            np.savez(fp, **arrays)
+        os.replace(tmp, self._file(key))
+        self.evict()
+
+    def cached(self, name, params, func, sources=()):
+        """Return `func()` (a dict of arrays), computed only when not in the cache."""
+        key = make_key(name, params, sources)
+        res = self.get(key)
+        if res is not None:
+            self.hits += 1
+            return res
+        self.misses += 1
+        res = {k: np.asarray(v) for k, v in func().items()}
+        self.put(key, res)
+        return res
+
+    def _entries(self):
+        """(mtime, size, path) of the stored files, skipping those removed meanwhile."""
+        res = []
+        for name in os.listdir(self.path):
+            if name.endswith(".npz"):
+                try:
+                    st = os.stat(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    continue # Removed by another process
+                res.append((st.st_mtime, st.st_size, os.path.join(self.path, name)))
+        return res
+
+    def size(self):
+        """Total size in bytes of the cache folder."""
+        if not os.path.isdir(self.path):
+            return 0
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Remove least recently used files until the cache fits in `max_bytes`."""
+        files = sorted(self._entries())
+        total = sum(size for _, size, _ in files)
+        for _, size, f in files:
+            if total <= self.max_bytes:
+                break
+            total -= size
+            try:
+                os.remove(f)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        if os.path.isdir(self.path):
+            for f in os.listdir(self.path):
+                if f.endswith(".npz"):
+                    try:
+                        os.remove(os.path.join(self.path, f))
+                    except FileNotFoundError:
+                        pass
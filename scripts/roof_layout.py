@@ -0,0 +1,213 @@
+"""
+Roof layout: place as many panels as possible on a roof, under a shading limit.
+
+The roof is a plane (a `shading.Panel`: origin, tilt, azimuth) and a polygon in
+its (u, v) coordinates, with optional keep-out polygons (skylights, hatches...).
+Obstacles are flat convex 3D polygons as in `shading.py` (`box` gives the faces
+of a chimney, a HVAC unit, a parapet...). Panels lie flat on the roof.
+
+    1. The roof is cut into square cells. For each cell, the annual shading loss
+       (share of the yearly beam on the roof plane lost to the obstacles) is
+       precomputed: for each sun position, every shadow covers an interval of
+       each row of cells, so only (positions x rows) intervals are computed.
+    2. Every cell is a candidate slot (lower left corner of a panel). The loss and
+       the validity (inside the roof, outside the keep-outs) of all slots come from
+       summed-area tables of the cell grid.
+    3. Slots are taken row by row, from the bottom left (the densest packing on a
+       grid); the slots overlapping an accepted panel are removed through the
+       grid index of the candidates. Both orientations and a few grid offsets are
+       tried, the layout with the most panels wins.
+"""
+
+import time
+
+import numpy as np
+
+from shading import Panel, shadows, sun_vector
+from yield_kernel import SunPath
+
+CELL = 0.2 # m
+
+
+def box(x0, y0, x1, y1, z0, z1):
+    """Faces (4 sides and top) of an axis-aligned box, for the obstacles."""
+    c = [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
+    faces = [[(*c[i], z0), (*c[(i + 1) % 4], z0), (*c[(i + 1) % 4], z1), (*c[i], z1)] for i in range(4)]
+    faces.append([(*p, z1) for p in c])
+    return faces
+
+
+def inside_polygon(points, polygon):
+    """Mask of the `points` (N, 2) inside `polygon` (V, 2), even-odd rule."""
+    x, y = points[:, 0, None], points[:, 1, None]
+    px, py = np.asarray(polygon, dtype=float).T
+    qx, qy = np.roll(px, -1), np.roll(py, -1)
+    cross = (py > y) != (qy > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xi = px + (y - py) * (qx - px) / (qy - py)
+    return ((cross & (x < xi)).sum(axis=1) % 2) == 1
+
+
+def _row_intervals(poly, v):
+    """
+    Intersections of the convex polygons `poly` (T, V, 2) with the lines `v` (R,):
+    (u_min, u_max) arrays of shape (T, R), NaN where the line misses the polygon.
+    """
+    p = poly[:, None, :, :]
+    q = np.roll(poly, -1, axis=1)[:, None, :, :]
+    pv, qv = p[..., 1], q[..., 1]
+    vv = v[None, :, None]
+    hit = (pv - vv) * (qv - vv) <= 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(qv != pv, (vv - pv) / (qv - pv), 0.)
+    u = np.where(hit, p[..., 0] + t * (q[..., 0] - p[..., 0]), np.nan)
+    with np.errstate(all="ignore"):
+        return np.fmin.reduce(u, axis=2), np.fmax.reduce(u, axis=2)
+
+
+class Roof:
+    """
+    Roof plane `plane` (a `shading.Panel`, its width / length are unused) and outline
+    `polygon` in its (u, v) coordinates (m), minus the `keep_out` polygons.
+    """
+
+    def __init__(self, plane, polygon, keep_out=(), obstacles=(), cell=CELL):
+        self.plane = plane
+        self.polygon = np.asarray(polygon, dtype=float)
+        self.cell = cell
+        self.obstacles = obstacles
+
+        lo, hi = self.polygon.min(axis=0), self.polygon.max(axis=0)
+        self.origin = lo
+        self.shape = tuple(np.ceil((hi - lo) / cell).astype(int)) # (nu, nv)
+        u = lo[0] + (np.arange(self.shape[0]) + 0.5) * cell
+        v = lo[1] + (np.arange(self.shape[1]) + 0.5) * cell
+        self.centers = np.stack(np.meshgrid(u, v, indexing="ij"), axis=-1).reshape(-1, 2)
+
+        ok = inside_polygon(self.centers, self.polygon)
+        for poly in keep_out:
+            ok &= ~inside_polygon(self.centers, poly)
+        self.usable = ok.reshape(self.shape)
+        self.loss = None
+
+    def shading_loss(self, lat, n_hour=48, day_step=7, chunk=256):
+        """
+        Annual shading loss (0 - 1) of each cell, weighted by the beam on the roof plane.
+        Sun positions: `n_hour` per day, one day out of `day_step`.
+        """
+        path = SunPath(lat, np.arange(0, 365, day_step), n_hour)
+        sun = sun_vector(path.alpha, path.azimuth).reshape(-1, 3)
+        beam = sun @ self.plane.normal
+        lit = (sun[:, 2] > 0) & (beam > 1e-9)
+        sun, beam = sun[lit], beam[lit]
+
+        nu, nv = self.shape
+        v = self.origin[1] + (np.arange(nv) + 0.5) * self.cell
+        lost = np.zeros(nv * (nu + 1))
+        for i in range(0, len(sun), chunk):
+            shadow = shadows(self.plane, self.obstacles, sun[i:i + chunk])
+            if not shadow:
+                continue # no obstacle in front of the roof
+            # Shadows cut the rows of cells into intervals of shaded cell centers
+            lo, hi = zip(*[_row_intervals(poly, v) for poly in shadow])
+            lo = np.ceil((np.stack(lo, -1) - self.origin[0]) / self.cell - 0.5)
+            hi = np.floor((np.stack(hi, -1) - self.origin[0]) / self.cell - 0.5) + 1
+            lo, hi = np.clip(lo, 0, nu), np.clip(hi, 0, nu)
+            empty = ~(hi > lo) # also NaN: missed rows
+            lo, hi = np.where(empty, nu, lo), np.where(empty, nu, hi)
+
+            # Union of the intervals of the obstacles: sorted by start, a new block
+            # starts when an interval begins after the end of all the previous ones
+            order = np.argsort(lo, axis=-1)
+            lo = np.take_along_axis(lo, order, -1)
+            end = np.maximum.accumulate(np.take_along_axis(hi, order, -1), axis=-1)
+            new = np.ones(lo.shape, dtype=bool)
+            new[..., 1:] = lo[..., 1:] > end[..., :-1]
+            last = np.ones(lo.shape, dtype=bool)
+            last[..., :-1] = new[..., 1:]
+
+            # Beam weighted difference array along each row
+            w = np.broadcast_to(beam[i:i + chunk, None, None], lo.shape)
+            row = np.broadcast_to(np.arange(nv)[None, :, None] * (nu + 1), lo.shape)
+            lost += np.bincount((row + lo)[new].astype(int), w[new], len(lost))
+            lost -= np.bincount((row + end)[last].astype(int), w[last], len(lost))
+
+        lost = lost.reshape(nv, nu + 1).cumsum(axis=1)[:, :nu].T
+        self.loss = np.where(self.usable, lost / max(beam.sum(), 1e-12), 0.)
+        return self.loss
+
+    def _slots(self, w, h):
+        """Validity and mean loss of a `w` x `h` cells panel at each lower left cell."""
+        def window_sum(a):
+            s = np.zeros((a.shape[0] + 1, a.shape[1] + 1))
+            s[1:, 1:] = a.cumsum(0).cumsum(1)
+            return s[w:, h:] - s[:-w, h:] - s[w:, :-h] + s[:-w, :-h]
+
+        if w > self.shape[0] or h > self.shape[1]:
+            return np.zeros((0, 0), dtype=bool), np.zeros((0, 0))
+        valid = window_sum(~self.usable) == 0
+        loss = window_sum(self.loss) / (w * h)
+        return valid, loss
+
+    def pack(self, width=1.0, length=1.7, max_loss=0.05, gap=0., offsets=4):
+        """
+        Panels of `width` x `length` m (plus `gap` between them) whose annual shading
+        loss is at most `max_loss`. Return a list of (u, v, du, dv, loss) in m.
+        """
+        if self.loss is None:
+            raise ValueError("Call `shading_loss` first")
+
+        best = []
+        for size in ((width, length), (length, width)):
+            w, h = (int(np.ceil((s + gap) / self.cell)) for s in size)
+            valid, loss = self._slots(w, h)
+            valid &= loss <= max_loss
+            for k in range(offsets):
+                taken = self._greedy(valid, w, h, start=(k * w // offsets, k * h // offsets))
+                if len(taken) > len(best):
+                    best = [(self.origin[0] + i * self.cell, self.origin[1] + j * self.cell,
+                             size[0], size[1], loss[i, j]) for i, j in taken]
+        return best
+
+    @staticmethod
+    def _greedy(valid, w, h, start=(0, 0)):
+        """
+        Bottom-left greedy on the candidate grid `valid`, scanning the slots from `start`:
+        a free run gets panels at `start + k * pitch`, the slots before `start` are
+        scanned last (wrapping around), so an offset moves the panels without dropping any.
+        """
+        free = valid.copy()
+        taken = []
+        s0, s1 = np.minimum(start, free.shape)
+        cols = np.r_[s0:free.shape[0], 0:s0]
+        for j in np.r_[s1:free.shape[1], 0:s1]: # rows (v), bottom first
+            for i in cols[free[cols, j]]:
+                if free[i, j]:
+                    taken.append((i, j))
+                    # Spatial index: remove the candidates overlapping this panel
+                    free[max(i - w + 1, 0):i + w, max(j - h + 1, 0):j + h] = False
+        return taken
+
+
+if __name__ == "__main__":
+
+    # Flat 40 x 20 m roof, L shaped, with a skylight, HVAC units and a parapet
+    plane = Panel(origin=(0., 0., 10.), tilt=0.)
+    polygon = [(0, 0), (40, 0), (40, 20), (15, 20), (15, 12), (0, 12)]
+    keep_out = [[(20, 5), (24, 5), (24, 8), (20, 8)]]
+    obstacles = (box(8, 3, 10, 6, 10, 12.5) + box(30, 14, 33, 16, 10, 13)
+                 + box(0, -0.3, 40, 0, 10, 11)) # parapet on the south edge
+
+    roof = Roof(plane, polygon, keep_out, obstacles)
+    t = time.perf_counter()
+    loss = roof.shading_loss(lat=50)
+    t_loss = time.perf_counter() - t
+
+    t = time.perf_counter()
+    layout = roof.pack(max_loss=0.05, gap=0.1)
+    t_pack = time.perf_counter() - t
+
+    print("{} cells, shading losses in {:.2f} s, layout in {:.2f} s".format(
+        roof.usable.sum(), t_loss, t_pack))
+    print("{} panels, mean shading loss {:.1f} %, worst {:.1f} %".format(
+        len(layout), 100 * np.mean([p[4] for p in layout]), 100 * max(p[4] for p in layout)))
@@ -0,0 +1,164 @@
+"""
+Self-consumption and battery dispatch of households.
+
+Production: AC power per kWp of a fixed system (`pv_power.annual_power`, fixed tilt
+incidence of a `yield_kernel.SunPath`), scaled by the kWp of each household.
+Load: one profile per household (kW), given chunk by chunk.
+
+Dispatch rule at each step, self-consumption first:
+
+    - surplus (pv > load): charges the battery, within its power and capacity,
+      the rest is exported;
+    - deficit: served by the battery, within its power and state of charge,
+      the rest is imported.
+
+`eta` is the one-way efficiency (charge and discharge each). Time runs in chunks
+(one day by default): only the state of charge and the energy totals are carried
+from one chunk to the next, so the memory is (households x chunk steps) whatever
+the length of the series, and the loads never need to fit in memory.
+
+The state of charge loop runs in `jit_backend.battery_dispatch` (numba, parallel
+over the households), or without numba in a NumPy loop over the steps,
+vectorized over the households.
+
+Run this file to time a 1-minute year (`python3 self_consumption.py [n_households]`).
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import jit_backend
+from pv_power import annual_power
+
+TOTALS = ("pv", "load", "import", "export", "charge", "discharge") # kWh, columns of the totals
+CHUNK = 1440 # steps, a day at 1 minute
+
+
+def dispatch_numpy(pv, load, kwp, capacity, power, eta, dt, soc, totals):
+    """
+    One chunk: `pv` (S,) kW per kWp, `load` (H, S) kW (float32 or float64). `soc` (H,) kWh and `totals` (H, 6)
+    are updated in place.
+    """
+    net = np.multiply.outer(kwp, pv)
+    totals[:, 0] += net.sum(axis=1) * dt
+    totals[:, 1] += load.sum(axis=1, dtype=float) * dt
+    net -= load
+
+    flow = np.empty_like(net) # > 0: charge, < 0: discharge
+    for t in range(net.shape[1]):
+        n = net[:, t]
+        c = np.minimum(np.minimum(n.clip(0), power), (capacity - soc) / (eta * dt)).clip(0)
+        d = np.minimum(np.minimum((-n).clip(0), power), soc * eta / dt).clip(0)
+        soc += (c * eta - d / eta) * dt
+        flow[:, t] = c - d
+
+    charge, discharge = flow.clip(0), (-flow).clip(0)
+    totals[:, 2] += (-net - discharge).clip(0).sum(axis=1) * dt
+    totals[:, 3] += (net - charge).clip(0).sum(axis=1) * dt
+    totals[:, 4] += charge.sum(axis=1) * dt
+    totals[:, 5] += discharge.sum(axis=1) * dt
+
+
+def simulate(pv, loads, kwp, capacity, power, eta=0.95, dt=1/60, soc0=0., backend=None):
+    """
+    Run the dispatch over the production `pv` (T,) (kW per kWp) and the `loads`, an
+    iterable of (H, S) chunks (kW) covering the T steps in order (or a (H, T) array).
+    `kwp`, `capacity` (kWh), `power` (kW): scalars or (H,) arrays. `dt`: step (hour).
+
+    Return a dict of (H,) arrays: the energies of `TOTALS` (kWh), "soc" (final, kWh),
+    "self_consumption" (share of the production used on site), "self_sufficiency"
+    (share of the load not imported) and "cycles" (equivalent full cycles).
+    """
+    if isinstance(loads, np.ndarray):
+        array = loads
+        loads = (array[:, i:i + CHUNK] for i in range(0, array.shape[1], CHUNK))
+    use_jit = jit_backend.use_jit(backend)
+    run = jit_backend.battery_dispatch if use_jit else dispatch_numpy
+
+    pv = np.asarray(pv, dtype=float)
+    start, soc, totals = 0, None, None
+    for load in loads:
+        load = np.ascontiguousarray(load)
+        if soc is None:
+            n = load.shape[0]
+            kwp, capacity, power = (np.broadcast_to(np.asarray(v, dtype=float), (n,)).copy()
+                                    for v in (kwp, capacity, power))
+            soc = np.minimum(np.full(n, float(soc0)), capacity)
+            totals = np.zeros((n, len(TOTALS)))
+        stop = start + load.shape[1]
+        if stop > len(pv):
+            raise ValueError("The loads are longer than the production ({} steps)".format(len(pv)))
+        run(pv[start:stop], load, kwp, capacity, power, eta, dt, soc, totals)
+        start = stop
+
+    if soc is None:
+        raise ValueError("No load given")
+    res = dict(zip(TOTALS, totals.T))
+    res["soc"] = soc
+    with np.errstate(divide="ignore", invalid="ignore"):
+        res["self_consumption"] = np.where(res["pv"] > 0, 1 - res["export"] / res["pv"], 0.)
+        res["self_sufficiency"] = np.where(res["load"] > 0, 1 - res["import"] / res["load"], 0.)
+        res["cycles"] = np.where(capacity > 0, res["discharge"] / capacity, 0.)
+    return res
+
+
+def synthetic_loads(n_households, steps_per_day=1440, days=365, annual_kwh=4000., chunk_days=1, seed=0):
+    """
+    Household loads (kW), `chunk_days` days at a time: base load, morning and
+    evening peaks, more in winter, random scale and noise per household (float32).
+    """
+    rng = np.random.default_rng(seed)
+    hours = (np.arange(steps_per_day) + 0.5) * 24 / steps_per_day
+    shape = (0.3 + np.exp(-0.5 * ((hours - 7.5) / 1.2)**2)
+             + 1.6 * np.exp(-0.5 * ((hours - 19.5) / 2.)**2))
+    shape /= shape.mean()
+    scale = annual_kwh / 8760 * rng.lognormal(0, 0.3, n_households)[:, None]
+    shift = rng.integers(-60, 60, n_households) * steps_per_day // 1440 # habits +- 1 h
+
+    rows = (np.arange(steps_per_day)[None, :] - shift[:, None]) % steps_per_day
+    base = scale * shape[rows] # (H, steps per day)
+    for d0 in range(0, days, chunk_days):
+        d = np.arange(d0, min(d0 + chunk_days, days))
+        season = 1 + 0.25 * np.cos(2 * np.pi * (d + 10) / 365) # highest mid January
+        noise = rng.random((n_households, len(d), steps_per_day), dtype=np.float32)
+        noise += 0.5
+        noise *= base[:, None, :] * season[None, :, None]
+        yield noise.reshape(n_households, -1)
+
+
+if __name__ == "__main__":
+
+    n_households = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    lat0, tilt, step_min = 50, 35, 1
+    dt = step_min / 60
+    steps = 1440 // step_min
+
+    pv = annual_power(lat0, tilt, step_min=step_min)["ac"].ravel()
+    rng = np.random.default_rng(1)
+    kwp = rng.choice([3., 4.5, 6., 9.], n_households)
+    capacity = rng.choice([0., 5., 10., 13.5], n_households)
+    power = np.where(capacity > 0, 5., 0.)
+
+    # Parity of the backends on a week of a few households
+    if jit_backend.HAVE_NUMBA:
+        n = min(n_households, 50)
+        week = np.concatenate(list(synthetic_loads(n, steps, days=7)), axis=1)
+        ref = simulate(pv, week, kwp[:n], capacity[:n], power[:n], dt=dt, backend="numpy")
+        new = simulate(pv, week, kwp[:n], capacity[:n], power[:n], dt=dt, backend="numba")
+        print("parity numba / numpy: max abs diff {:.1e} kWh".format(
+            max(np.abs(new[k] - ref[k]).max() for k in TOTALS)))
+
+    t = time.perf_counter()
+    res = simulate(pv, synthetic_loads(n_households, steps), kwp, capacity, power, dt=dt)
+    elapsed = time.perf_counter() - t
+
+    print("{} households x {} steps ({}) in {:.1f} s, {:.1f} ms per household".format(
+        n_households, len(pv), jit_backend.resolve(), elapsed, 1000 * elapsed / n_households))
+    for c in sorted(set(capacity)):
+        m = capacity == c
+        print("battery {:4.1f} kWh: self-consumption {:4.1f} %, self-sufficiency {:4.1f} %, "
+              "import {:5.0f} kWh, export {:5.0f} kWh, {:3.0f} cycles".format(
+                  c, 100 * res["self_consumption"][m].mean(), 100 * res["self_sufficiency"][m].mean(),
+                  res["import"][m].mean(), res["export"][m].mean(), res["cycles"][m].mean()))
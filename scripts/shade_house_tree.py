@@ -14,17 +14,22 @@ Parameters:
 """
 
 
-from bokeh.plotting  import ColumnDataSource, figure, output_file, show
-from bokeh.models    import HoverTool, CustomJS, Slider
-from bokeh.layouts   import column
-
 import numpy as np
 import os
 
+from profiling import profiler
+
 
 if __name__ == "__main__":
+    from bokeh.plotting  import ColumnDataSource, figure, output_file, show
+    from bokeh.models    import HoverTool, CustomJS, Slider
+    from bokeh.layouts   import column
+
+    profiler.enable_from_argv()
+
     
 
+    profiler.start("bokeh_model")
     p = figure(plot_width=700, plot_height=400,
             match_aspect=True, # X and Y same scale
             tools="pan,lasso_select,wheel_zoom,box_select,tap,reset,save",
@@ -243,6 +248,8 @@ if __name__ == "__main__":
 
 
 
+    profiler.start("save")
     output_file("../html/shade_tree_over_the_house.html", title="Tree shade on the house.")
     show(column(p, slider_tree, slider_dist, slider_wall, slider_sun))
+    profiler.report()
 
@@ -7,12 +7,10 @@ Draw a solar panel and its shade.
 """
 
 
-from bokeh.plotting  import ColumnDataSource, figure, output_file, show
-from bokeh.models    import HoverTool, CustomJS, Slider
-from bokeh.layouts   import column
-
 import numpy as np
 
+from profiling import profiler
+
 def d2r(x):
     return x/180*np.pi
 
@@ -21,7 +19,14 @@ def r2d(x):
 
 
 if __name__ == "__main__":
+    from bokeh.plotting  import ColumnDataSource, figure, output_file, show
+    from bokeh.models    import HoverTool, CustomJS, Slider
+    from bokeh.layouts   import column
+
+    profiler.enable_from_argv()
+
     
+    profiler.start("bokeh_model")
     p = figure(plot_width=700, plot_height=400,
             match_aspect=True, # X and Y same scale
             tools="pan,wheel_zoom,reset,save",
@@ -150,6 +155,8 @@ if __name__ == "__main__":
 
 
 
+    profiler.start("save")
     output_file("../html/shade_solar_panel_spacing.html", title="Shade of a solar panel given panel and sun angles.")
     show(column(p, slider_p_size, slider_p_angle, slider_s_angle))
+    profiler.report()
 
@@ -0,0 +1,204 @@
+"""
+Shaded fraction of a panel surface, vectorized over the sun positions.
+
+`shade_house_tree.py` tells whether light reaches a wall, `shade_panel_spacing.py`
+draws one shadow length. Here the obstacles are flat convex polygons in 3D
+(a wall, a fence, the silhouette of a tree, the faces of a chimney...) and the
+panel a rectangle. For each sun position:
+
+    1. the obstacle, cut to the half-space in front of the panel (once),
+       is projected along the sun rays onto the panel plane;
+    2. its shadow (still convex) is clipped to the panel rectangle
+       (Sutherland - Hodgman, one half-plane at a time);
+    3. the shaded area is the area of the union of the shadows
+       (inclusion - exclusion, so keep a handful of obstacles per panel).
+
+All the steps work on (positions, vertices, 2) arrays: a whole year of sun
+positions is processed by chunks, without a Python loop over time.
+
+Frame: x east, y north, z up (meters). Azimuths from south, positive toward west,
+as in the other scripts.
+"""
+
+import itertools
+import time
+
+import numpy as np
+
+from yield_kernel import DAYS, N_HOUR, SunPath, d2r
+
+CHUNK = 8192
+
+
+def sun_vector(alpha, azimuth):
+    """Unit vectors (..., 3) toward the sun, from elevation / azimuth in radian."""
+    ca = np.cos(alpha)
+    return np.stack([-ca * np.sin(azimuth), -ca * np.cos(azimuth), np.sin(alpha)], axis=-1)
+
+
+class Panel:
+    """
+    Rectangle `width` (horizontal edge) x `length` (along the slope) whose lower
+    left corner is `origin`, tilted by `tilt` and facing `azimuth` (degree).
+    """
+
+    def __init__(self, origin=(0., 0., 0.), width=1.7, length=1., tilt=35., azimuth=0.):
+        self.origin = np.asarray(origin, dtype=float)
+        self.width = width
+        self.length = length
+        t, pa = d2r(tilt), d2r(azimuth)
+        self.e1 = np.array([np.cos(pa), -np.sin(pa), 0.]) # horizontal edge
+        self.e2 = np.array([np.sin(pa) * np.cos(t), np.cos(pa) * np.cos(t), np.sin(t)]) # up the slope
+        self.normal = np.array([-np.sin(pa) * np.sin(t), -np.cos(pa) * np.sin(t), np.cos(t)])
+
+    def corners(self):
+        return np.array([self.origin, self.origin + self.width * self.e1,
+                         self.origin + self.width * self.e1 + self.length * self.e2,
+                         self.origin + self.length * self.e2])
+
+    def front(self, polygon, eps=1e-9):
+        """Part of a 3D polygon (V, 3) in front of the panel plane (may be empty)."""
+        h = (polygon - self.origin) @ self.normal
+        out = []
+        for i in range(len(polygon)):
+            p, q, hp, hq = polygon[i], polygon[(i + 1) % len(polygon)], h[i], h[(i + 1) % len(polygon)]
+            if (hp >= -eps) != (hq >= -eps):
+                out.append(p + (q - p) * hp / (hp - hq))
+            if hq >= -eps:
+                out.append(q)
+        return np.array(out).reshape(-1, 3)
+
+
+def _clip(poly, a, b):
+    """
+    Clip convex polygons `poly` (T, M, 2), padded by repeating vertices, to the
+    half-planes `a . x <= b` (`a`: (T, 2) or (2,), `b`: (T,) or scalar).
+    Return (T, M + 1, 2) polygons, padded the same way (all zeros when empty).
+    """
+    T, M, _ = poly.shape
+    a = np.broadcast_to(a, (T, 2))[:, None, :]
+    b = np.broadcast_to(b, (T,))[:, None]
+    nxt = np.roll(poly, -1, axis=1)
+    dp = (poly * a).sum(-1) - b
+    dq = (nxt * a).sum(-1) - b
+    in_q = dq <= 0
+    cross = (dp <= 0) != in_q
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(cross, dp / (dp - dq), 0.)
+    inter = poly + t[..., None] * (nxt - poly)
+
+    # Each edge gives [intersection][next vertex], kept when valid, in order
+    cand = np.stack([inter, nxt], axis=2).reshape(T, 2 * M, 2)
+    valid = np.stack([cross, in_q], axis=2).reshape(T, 2 * M)
+    order = np.argsort(~valid, axis=1, kind="stable")
+    count = valid.sum(axis=1)
+    idx = np.minimum(np.arange(M + 1), np.maximum(count - 1, 0)[:, None])
+    out = np.take_along_axis(cand, np.take_along_axis(order, idx, 1)[..., None], 1)
+    out[count == 0] = 0.
+    return out
+
+
+def signed_area(poly):
+    nxt = np.roll(poly, -1, axis=1)
+    return 0.5 * (poly[..., 0] * nxt[..., 1] - nxt[..., 0] * poly[..., 1]).sum(axis=1)
+
+
+def _clip_rect(poly, width, length):
+    for a, b in (((-1., 0.), 0.), ((1., 0.), width), ((0., -1.), 0.), ((0., 1.), length)):
+        poly = _clip(poly, np.array(a), b)
+    return poly
+
+
+def _intersect(poly, other):
+    """`poly` clipped to the convex polygons `other` (T, K, 2). Empty where `other` is degenerate."""
+    sign = np.sign(signed_area(other))
+    nxt = np.roll(other, -1, axis=1)
+    for k in range(other.shape[1]):
+        e = nxt[:, k] - other[:, k]
+        q = other[:, k]
+        a = sign[:, None] * np.stack([e[:, 1], -e[:, 0]], axis=1)
+        b = sign * (e[:, 1] * q[:, 0] - e[:, 0] * q[:, 1])
+        poly = _clip(poly, a, b)
+    poly[sign == 0] = 0.
+    return poly
+
+
+def shadows(panel, obstacles, sun):
+    """Shadows (T, V, 2) of the `obstacles` in the panel (u, v) coordinates, for sun vectors `sun` (T, 3)."""
+    sn = sun @ panel.normal
+    su = (sun @ panel.e1) / sn
+    sv = (sun @ panel.e2) / sn
+    res = []
+    for poly in obstacles:
+        poly = panel.front(np.asarray(poly, dtype=float))
+        if len(poly) < 3:
+            continue
+        rel = poly - panel.origin
+        h = rel @ panel.normal
+        u = rel @ panel.e1 - su[:, None] * h
+        v = rel @ panel.e2 - sv[:, None] * h
+        res.append(np.stack([u, v], axis=-1))
+    return res
+
+
+def shaded_fraction(panel, obstacles, sun):
+    """
+    Shaded fraction (0 - 1) of the panel for sun vectors `sun` (T, 3).
+    0 when the sun is below the horizon or behind the panel.
+    """
+    sun = np.atleast_2d(sun)
+    lit = (sun[:, 2] > 0) & (sun @ panel.normal > 1e-9)
+    res = np.zeros(len(sun))
+    if not lit.any():
+        return res
+
+    shadow = shadows(panel, obstacles, sun[lit])
+    clipped = [_clip_rect(s, panel.width, panel.length) for s in shadow]
+    area = np.zeros(lit.sum())
+    for n in range(1, len(clipped) + 1):
+        for subset in itertools.combinations(range(len(clipped)), n):
+            poly = clipped[subset[0]]
+            for i in subset[1:]:
+                poly = _intersect(poly, shadow[i])
+            area += (-1)**(n + 1) * np.abs(signed_area(poly))
+    res[lit] = area / (panel.width * panel.length)
+    return res.clip(0, 1)
+
+
+def shading_factors(path, panel, obstacles, chunk=CHUNK):
+    """Shaded fraction of the panel over a `SunPath`, shape (days, hours)."""
+    sun = sun_vector(path.alpha, path.azimuth).reshape(-1, 3)
+    res = np.empty(len(sun))
+    for i in range(0, len(sun), chunk):
+        res[i:i + chunk] = shaded_fraction(panel, obstacles, sun[i:i + chunk])
+    return res.reshape(path.alpha.shape)
+
+
+def annual_shading_loss(lat, panel, obstacles, n_hour=N_HOUR):
+    """Fraction of the yearly beam on the panel lost to the shade of the `obstacles`."""
+    path = SunPath(lat, DAYS, n_hour)
+    beam = (sun_vector(path.alpha, path.azimuth) @ panel.normal).clip(0) * path.msk
+    shade = shading_factors(path, panel, obstacles)
+    return (beam * shade).sum() / beam.sum()
+
+
+if __name__ == "__main__":
+
+    lat0 = 50
+    panel = Panel(origin=(0., 0., 0.3), width=1.7, length=1., tilt=35)
+    obstacles = [
+        # 2 m high wall, 3 m south of the panel
+        [(-3, -3, 0), (5, -3, 0), (5, -3, 2), (-3, -3, 2)],
+        # Silhouette of a tree, south west, facing the panel
+        [(-5, -6, 1), (-3, -4, 1), (-3, -4, 6), (-4, -5, 7), (-5, -6, 6)],
+    ]
+
+    path = SunPath(lat0)
+    t = time.perf_counter()
+    shade = shading_factors(path, panel, obstacles)
+    elapsed = time.perf_counter() - t
+    print("{} sun positions in {:.0f} ms".format(shade.size, 1000 * elapsed))
+    print("Yearly beam lost to the shade: {:.1f} %".format(100 * annual_shading_loss(lat0, panel, obstacles)))
+    for day in (0, 80, 172, 264):
+        print("day {:3d}: mean shaded fraction in daylight {:.2f}".format(
+            day, shade[day][path.msk[day]].mean()))
@@ -0,0 +1,155 @@
+"""
+Annual yield of any orientation from a histogram of the sun positions.
+
+At a given latitude, the yearly yield of a fixed panel only depends on how long
+the sun stays at each (elevation, azimuth). The sun positions of a whole year
+(1 minute steps by default) are binned once into the occupied cells of the sky:
+
+    - "weights":    time spent by the sun in each cell (hours), or clear sky DNI
+                    received from it (kWh/m², `weight="clear_sky"`);
+    - "directions": weighted mean direction of the sun in each cell, as the
+                    (U, V, W) terms of `yield_kernel.SunPath` plus cos(alpha).
+
+The histogram is cached per latitude (`result_cache.py`). The yield of N
+orientations is then `max(0, normals @ directions.T) @ weights`: the
+cos-incidence kernel (N, cells) is a single matrix product, and can be kept to
+weight it by another histogram with the same directions.
+
+The clip at 0 is applied to the mean direction of a cell, so the only error
+comes from cells crossed by the plane of the panel, where the cosine is ~0.
+
+Run this file to compare the run time and the values with `yield_kernel.annual_yield`.
+"""
+
+import time
+
+import numpy as np
+
+from pv_power import clear_sky_dni
+from result_cache import ResultCache
+from yield_kernel import DAYS, annual_yield, d2r, hour_angles, r2d, sun_angles
+
+WEIGHTS = ("time", "clear_sky")
+MOUNTS = ("fixed", "rotative")
+
+
+def sky_histogram(lat, d_elev=1., d_az=2., n_hour=1440, days=DAYS, weight="time", chunk=32):
+    """
+    Occupied cells (`d_elev` x `d_az` degree) of the sky over `days` at latitude `lat`.
+
+    Return a dict of arrays over the B cells: "elevation", "azimuth" (cell centers,
+    degree), "weights" (B,) and "directions" (B, 4).
+    """
+    if weight not in WEIGHTS:
+        raise ValueError("Unknown weight {}, choose among {}".format(weight, WEIGHTS))
+    n_elev, n_az = int(np.ceil(90 / d_elev)), int(np.ceil(360 / d_az))
+    n_cell = n_elev * n_az
+    hra = hour_angles(n_hour)
+    hours = 24 / n_hour # duration of a sample
+
+    weights = np.zeros(n_cell)
+    sums = np.zeros((4, n_cell))
+    for i in range(0, len(days), chunk):
+        alpha, azimuth = sun_angles(lat, np.asarray(days[i:i + chunk])[:, None], hra[None, :])
+        up = alpha >= 0
+        alpha, azimuth = alpha[up], azimuth[up]
+
+        e = np.minimum((r2d(alpha) / d_elev).astype(int), n_elev - 1)
+        a = np.minimum(((r2d(azimuth) + 180) / d_az).astype(int), n_az - 1)
+        cell = e * n_az + a
+
+        w = np.full(len(alpha), hours)
+        if weight == "clear_sky":
+            w *= clear_sky_dni(np.sin(alpha)) / 1000
+        ca = np.cos(alpha)
+        weights += np.bincount(cell, w, n_cell)
+        for k, v in enumerate((np.sin(alpha), ca * np.cos(azimuth), ca * np.sin(azimuth), ca)):
+            sums[k] += np.bincount(cell, w * v, n_cell)
+
+    occupied = np.flatnonzero(weights > 0)
+    return {
+        "elevation": (occupied // n_az + 0.5) * d_elev,
+        "azimuth": (occupied % n_az + 0.5) * d_az - 180,
+        "weights": weights[occupied],
+        "directions": (sums[:, occupied] / weights[occupied]).T,
+    }
+
+
+def cached_histogram(lat, d_elev=1., d_az=2., n_hour=1440, weight="time", cache=None):
+    """
+    `sky_histogram` over the whole year, read from / stored in the result cache.
+    The key covers the modules imported here, so `pv_power.clear_sky_dni` for "clear_sky".
+    """
+    cache = cache or ResultCache()
+    return cache.cached("sky_histogram",
+                        dict(lat=lat, d_elev=d_elev, d_az=d_az, n_hour=n_hour, weight=weight),
+                        lambda: sky_histogram(lat, d_elev, d_az, n_hour, weight=weight),
+                        sources=[__file__])
+
+
+def normals(tilt, azimuth=0., mount="fixed"):
+    """
+    Panel terms (N, 4) to multiply with the directions, `tilt` / `azimuth` in degree:
+    cos(incidence) for "fixed", sin(alpha + tilt) for "rotative" (`yield_year.py`).
+    """
+    if mount not in MOUNTS:
+        raise ValueError("Unknown mount {}, choose among {}".format(mount, MOUNTS))
+    b, pa = np.broadcast_arrays(*(d2r(np.atleast_1d(np.asarray(x, dtype=float))) for x in (tilt, azimuth)))
+    zero = np.zeros(len(b))
+    if mount == "fixed":
+        return np.stack([np.cos(b), np.sin(b) * np.cos(pa), np.sin(b) * np.sin(pa), zero], axis=1)
+    return np.stack([np.cos(b), zero, zero, np.sin(b)], axis=1)
+
+
+def incidence_kernel(hist, tilt, azimuth=0., mount="fixed"):
+    """Cos-incidence kernel (N, B) of the panels on the cells of `hist`."""
+    kernel = normals(tilt, azimuth, mount) @ hist["directions"].T
+    return np.maximum(kernel, 0., out=kernel)
+
+
+def orientation_yield(hist, tilt, azimuth=0., mount="fixed", kernel=None, chunk=1024):
+    """
+    Annual yield of each panel: hours at full sun ("time" histogram) or kWh/m² of beam
+    ("clear_sky"). The yield (%) of `yield_year.py` is `200 * hours / 8760`.
+    """
+    if kernel is not None:
+        return kernel @ hist["weights"]
+    tilt, azimuth = np.broadcast_arrays(np.atleast_1d(tilt), np.atleast_1d(azimuth))
+    return np.concatenate([incidence_kernel(hist, tilt[i:i + chunk], azimuth[i:i + chunk], mount)
+                           @ hist["weights"] for i in range(0, len(tilt), chunk)])
+
+
+if __name__ == "__main__":
+
+    lat0 = 50
+    t = time.perf_counter()
+    hist = sky_histogram(lat0)
+    t_hist = time.perf_counter() - t
+    print("Histogram of {} sun positions: {} cells in {:.2f} s".format(365 * 1440, len(hist["weights"]), t_hist))
+
+    tilts, azimuths = np.meshgrid(np.arange(90.), np.arange(-90., 91., 5.), indexing="ij")
+    tilts, azimuths = tilts.ravel(), azimuths.ravel()
+
+    orientation_yield(hist, tilts[:10], azimuths[:10]) # warm-up
+    t = time.perf_counter()
+    hours = orientation_yield(hist, tilts, azimuths)
+    t_hist = time.perf_counter() - t
+
+    # Reference: same sun positions, one time sample at a time
+    ref_tilts, ref_az = tilts[::37], azimuths[::37]
+    t = time.perf_counter()
+    ref = annual_yield(lat0, ref_tilts, ref_az, n_hour=1440)
+    t_ref = (time.perf_counter() - t) * len(tilts) / len(ref_tilts)
+
+    print("{} orientations: {:.1f} ms, {:.0f} x faster than the time series ({:.1f} s)".format(
+        len(tilts), 1000 * t_hist, t_ref / t_hist, t_ref))
+    print("max abs diff {:.3f} % of yield".format(np.abs(200 * hours[::37] / 8760 - ref).max()))
+
+    best = np.argmax(hours)
+    print("Best orientation: tilt {:.0f}°, azimuth {:.0f}°, {:.0f} full sun hours / year".format(
+        tilts[best], azimuths[best], hours[best]))
+
+    beta = np.arange(90.)
+    rot = orientation_yield(hist, beta, mount="rotative")
+    print("rotative mount, max abs diff {:.3f} %".format(
+        np.abs(200 * rot / 8760 - annual_yield(lat0, beta, mount="rotative", n_hour=1440)).max()))
@@ -4,13 +4,11 @@ Sun elevation angle = f(t)
 for different dates and different latitudes
 
 """
-from bokeh.plotting  import ColumnDataSource, figure, output_file, show
-from bokeh.models    import HoverTool, CustomJS
-from bokeh.models    import Slider
-from bokeh.layouts   import column
 
 import numpy as np
 
+from profiling import profiler
+
 def d2r(x):
     return x/180 * np.pi
 
@@ -19,6 +17,13 @@ def r2d(x):
 
 
 if __name__ == "__main__":
+    from bokeh.plotting  import ColumnDataSource, figure, output_file, show
+    from bokeh.models    import HoverTool, CustomJS
+    from bokeh.models    import Slider
+    from bokeh.layouts   import column
+
+    profiler.enable_from_argv()
+
     
 
     lat0  = 50
@@ -26,11 +31,13 @@ if __name__ == "__main__":
     gamma0 =  23.433333 * np.sin(2 * np.pi * (day0 + 284) / 365);
 
 
+    profiler.start("sun_position")
     hours = np.linspace(0, 24, 200)
     hra    = 15 * (hours - 12) 
     angles = np.arcsin(np.sin(d2r(gamma0)) * np.sin(d2r(lat0)) 
                       + np.cos(d2r(gamma0)) * np.cos(d2r(lat0)) * np.cos(d2r(hra)))
 
+    profiler.start("bokeh_model")
     source = ColumnDataSource(data=dict(x=hours, y=r2d(angles),hra=d2r(hra)))
 
     # Slider lat
@@ -87,7 +94,9 @@ if __name__ == "__main__":
     p.xgrid.ticker = [i for i in range(25)]
     p.xaxis.ticker = [i*3 for i in range(9)]
 
+    profiler.start("save")
     output_file("../html/Sun_elevation_over_the_day.html", title="Sun angle = f(day, lat).")
     show(column(p, slider_lat, slider_day))
+    profiler.report()
     
 
@@ -0,0 +1,163 @@
+"""
+Sun path diagram: sun elevation vs azimuth over the year, for several latitudes.
+
+    - one curve per date (the 21st of each month), from sunrise to sunset;
+    - one analemma per clock hour (the sun position at the same mean time
+      every day of the year, shifted by the equation of time);
+    - optionally, the horizon (buildings, trees, relief) as a filled profile.
+
+The sun positions of all latitudes x days x times are computed in one pass:
+the day terms (declination) and the time terms (hour angle) are computed once
+and broadcast, so the resolution can go below the minute at no per-day cost.
+
+Azimuth from south, positive toward west, as in the other scripts.
+
+The figure computes the date curves every 10 s and keeps at most `MAX_POINTS`
+samples per curve (LTTB, see `downsample.py`).
+"""
+
+import time
+
+import numpy as np
+
+from downsample import select
+from profiling import profiler
+from yield_kernel import DAYS, d2r, declination, r2d
+
+DATES = np.array([20, 51, 79, 110, 140, 171, 201, 232, 263, 293, 324, 354]) # 21st of each month
+MAX_POINTS = 150 # per date curve in the figure
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+def equation_of_time(N):
+    """Equation of time (minutes, true minus mean solar time) for day `N`, Spencer series."""
+    g = 2 * np.pi * np.asarray(N) / 365
+    return 229.18 * (0.000075 + 0.001868 * np.cos(g) - 0.032077 * np.sin(g)
+                     - 0.014615 * np.cos(2 * g) - 0.040849 * np.sin(2 * g))
+
+
+def sun_path(lats, days, hra):
+    """
+    Elevation and azimuth (degree) for every latitude x day x hour angle.
+
+    `hra` (radian) is either 1D (same hour angles every day) or (days, hours).
+    Return two arrays of shape (lats, days, hours).
+    """
+    L = d2r(np.atleast_1d(np.asarray(lats, dtype=float)))[:, None, None]
+    gamma = d2r(declination(days))[None, :, None]
+    hra = np.asarray(hra, dtype=float)
+    hra = hra[None, None, :] if hra.ndim == 1 else hra[None]
+
+    sl, cl = np.sin(L), np.cos(L)
+    sg, cg = np.sin(gamma), np.cos(gamma)
+    ch, sh = np.cos(hra), np.sin(hra)
+
+    elev = np.arcsin(sl * sg + cl * cg * ch)
+    az = np.arctan2(sh * cg, ch * cg * sl - sg * cl)
+    return r2d(elev), r2d(az)
+
+
+def day_curves(lats, days=DATES, step_s=60):
+    """Sun path of each of `days`, one sample every `step_s` seconds of solar time."""
+    hours = np.arange(0, 86400, step_s) / 3600
+    return sun_path(lats, days, d2r(15 * (hours - 12)))
+
+
+def analemmas(lats, clock_hours=np.arange(5, 20), days=DAYS):
+    """Sun position at each mean solar (clock) hour over the year, shape (lats, hours, days)."""
+    hra = d2r(15 * (np.asarray(clock_hours, dtype=float)[None, :] - 12)
+              + equation_of_time(days)[:, None] / 4)
+    elev, az = sun_path(lats, days, hra)
+    return elev.transpose(0, 2, 1), az.transpose(0, 2, 1)
+
+
+def below_horizon(elev, az, horizon):
+    """Mask of the positions hidden by `horizon`, a pair (azimuth, elevation) of degree arrays."""
+    h_az, h_elev = horizon
+    return elev < np.interp(az, h_az, h_elev, period=360)
+
+
+def sunshine_hours(elev, az, step_s, horizon=None):
+    """Hours of sun per curve (last axis = time), with the horizon if given."""
+    up = elev > 0
+    if horizon is not None:
+        up &= ~below_horizon(elev, az, horizon)
+    return up.sum(axis=-1) * step_s / 3600
+
+
+def example_horizon():
+    """House to the south east, a row of trees to the west, low hills elsewhere."""
+    az = np.arange(-180, 181, 1.)
+    elev = 3 + 2 * np.sin(d2r(3 * az))
+    elev = np.where((az > -60) & (az < -25), 25, elev)
+    elev = np.where((az > 50) & (az < 110), 15 + 5 * np.cos(d2r(12 * az)), elev)
+    return az, elev
+
+
+if __name__ == "__main__":
+    from bokeh.plotting  import ColumnDataSource, figure, output_file, show
+    from bokeh.models    import HoverTool, Panel, Tabs
+    from bokeh.palettes  import Category20
+
+    profiler.enable_from_argv()
+
+    lats = [30, 45, 60]
+    step_s = 10
+    horizon = example_horizon()
+
+    profiler.start("sun_position")
+    t = time.perf_counter()
+    elev_d, az_d = day_curves(lats, DATES, step_s)
+    elev_a, az_a = analemmas(lats, days=DAYS[::2])
+    elapsed = time.perf_counter() - t
+
+    profiler.start("reduction")
+    hours = sunshine_hours(elev_d, az_d, step_s, horizon)
+    hours_free = sunshine_hours(elev_d, az_d, step_s)
+    for lat, h, h0 in zip(lats, hours, hours_free):
+        print("lat {}: sun hours on the 21st of Jun {:.1f} h ({:.1f} h without the horizon)".format(
+            lat, h[5], h0[5]))
+    print("Sun positions computed in {:.1f} ms".format(1000 * elapsed))
+
+    profiler.start("bokeh_model")
+    colors = Category20[12]
+    tabs = []
+    for i, lat in enumerate(lats):
+        p = figure(plot_width=1000, plot_height=450,
+                   x_range=[-180, 180], y_range=[0, 90],
+                   tools="pan,wheel_zoom,box_zoom,reset,save",
+                   title="Sun path at latitude {}°".format(lat))
+
+        p.varea(x=horizon[0], y1=0, y2=horizon[1], fill_color="gray", fill_alpha=0.4,
+                legend_label="Horizon")
+
+        # Analemmas: a single glyph, labelled at their highest point
+        e = np.where(elev_a[i] > 0, elev_a[i], np.nan)
+        shown = [k for k in range(len(e)) if np.isfinite(e[k]).any()]
+        top = [np.nanargmax(e[k]) for k in shown]
+        p.multi_line([az_a[i, k] for k in shown], [e[k] for k in shown],
+                     line_color="black", line_alpha=0.4, line_width=1)
+        p.text([az_a[i, k, j] for k, j in zip(shown, top)], [e[k, j] + 1 for k, j in zip(shown, top)],
+               text=["{}h".format(5 + k) for k in shown], text_font_size="8pt", text_align="center")
+
+        for k, name in enumerate(MONTHS):
+            up = np.flatnonzero(elev_d[i, k] > 0) # sunrise to sunset, one segment in solar time
+            t_up = up * step_s / 3600
+            keep = up[select(t_up, elev_d[i, k, up], MAX_POINTS)]
+            source = ColumnDataSource(data=dict(x=az_d[i, k, keep], y=elev_d[i, k, keep],
+                                                t=keep * step_s / 3600))
+            p.line("x", "y", source=source, line_color=colors[k], line_width=2,
+                   legend_label="{} 21st ({:.1f} h of sun)".format(name, hours[i, k]))
+
+        p.add_tools(HoverTool(tooltips=[("Azimuth°", "@x"), ("Elevation°", "@y"), ("Solar hour", "@t")]))
+        p.legend.click_policy = "hide"
+        p.legend.label_text_font_size = "8pt"
+        p.xaxis.axis_label = "Azimuth (°, from south, positive toward west)"
+        p.yaxis.axis_label = "Sun angle (°)"
+        p.xaxis.ticker = [i * 30 for i in range(-6, 7)]
+        tabs.append(Panel(child=p, title="Lat {}°".format(lat)))
+
+    profiler.start("save")
+    output_file("../html/sun_path_diagram.html", title="Sun path diagram.")
+    show(Tabs(tabs=tabs))
+    profiler.report()
@@ -0,0 +1,217 @@
+"""
+Terrain horizon of sites from digital elevation model (DEM) tiles.
+
+Tiles are SRTM `.hgt` files: 1° x 1°, a square grid of big endian int16 (m), rows
+from north to south, named after their south west corner (`N45E006.hgt`), the
+last row / column shared with the next tile. They are opened as memory maps:
+only the pages holding the sampled cells are read, so a regional study never
+loads whole tiles into RAM.
+
+Horizon of a site: for each azimuth (from the south, positive west, as the sun
+azimuth of `yield_kernel.py`), the terrain is sampled along the ray at distances
+growing geometrically (fine near the site, coarser far away), and the horizon is
+the highest elevation angle, corrected for the earth curvature and the refraction.
+Sites are processed in batches, spread over a process pool.
+
+The profiles are (azimuth, elevation) pairs of degree arrays, as in
+`sun_path_diagram.py`; `horizon_mask` turns one into the shading mask of a
+`SunPath`, `horizon_loss` into the share of the yearly yield lost to the terrain.
+
+Usage:
+
+    python3 terrain_horizon.py [dem_folder]
+
+Without argument, synthetic tiles are written to a temporary folder, removed at the end.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from yield_kernel import DAYS, SunPath, d2r, r2d
+
+R_EARTH = 6371000. # m
+REFRACTION = 0.13  # coefficient of the atmospheric refraction
+VOID = -32768      # no data in SRTM tiles
+N_AZ = 360
+MAX_DIST = 30000.  # m
+N_DIST = 256
+
+
+class DEM:
+    """Folder of `.hgt` tiles, each opened as a memory map on first use."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._tiles = {}
+
+    def __getstate__(self):
+        # Sent to the workers: they open their own memory maps
+        return {"folder": self.folder, "_tiles": {}}
+
+    @staticmethod
+    def tile_name(lat, lon):
+        """File name of the tile whose south west corner is (`lat`, `lon`), integers."""
+        return "{}{:02d}{}{:03d}.hgt".format("N" if lat >= 0 else "S", abs(lat),
+                                             "E" if lon >= 0 else "W", abs(lon))
+
+    def tile(self, lat, lon):
+        """Memory map of a tile, None if it is not in the folder."""
+        key = (lat, lon)
+        if key not in self._tiles:
+            path = os.path.join(self.folder, self.tile_name(lat, lon))
+            grid = None
+            if os.path.exists(path):
+                n = int(round(np.sqrt(os.path.getsize(path) / 2)))
+                grid = np.memmap(path, dtype=">i2", mode="r", shape=(n, n))
+            self._tiles[key] = grid
+        return self._tiles[key]
+
+    def elevation(self, lat, lon):
+        """Elevation (m) at the points (degree arrays), bilinear, NaN over voids and missing tiles."""
+        lat, lon = np.broadcast_arrays(np.asarray(lat, dtype=float), np.asarray(lon, dtype=float))
+        out = np.full(lat.shape, np.nan)
+        flat, lat, lon = out.reshape(-1), lat.ravel(), lon.ravel()
+
+        # Tile of each point, as a single integer: the points cover a few tiles only
+        ids = (np.floor(lat).astype(int) + 90) * 360 + np.floor(lon).astype(int) + 180
+        for t in np.flatnonzero(np.bincount(ids - ids.min())) + ids.min():
+            a, b = t // 360 - 90, t % 360 - 180
+            grid = self.tile(a, b)
+            if grid is None:
+                continue
+            sel = np.flatnonzero(ids == t)
+            n = grid.shape[0] - 1
+            y = (a + 1 - lat[sel]) * n # rows from the north edge
+            x = (lon[sel] - b) * n
+            i = np.minimum(y.astype(int), n - 1)
+            j = np.minimum(x.astype(int), n - 1)
+            fy, fx = y - i, x - j
+
+            k = i * (n + 1) + j
+            # Plain ndarray view of the map: reads the 4 corners of every cell at once
+            z = np.asarray(grid).reshape(-1).take(k + np.array([0, 1, n + 1, n + 2])[:, None]).astype(float)
+            z[z == VOID] = np.nan
+            flat[sel] = ((z[0] * (1 - fx) + z[1] * fx) * (1 - fy)
+                         + (z[2] * (1 - fx) + z[3] * fx) * fy)
+        return out
+
+
+def horizon(dem, lat, lon, height=2., n_az=N_AZ, max_dist=MAX_DIST, n_dist=N_DIST, min_dist=50.):
+    """
+    Horizon of the sites (degree arrays (S,)), `height` m above the ground.
+
+    Return the azimuths (n_az,) and the horizon elevations (S, n_az), degree.
+    Directions without any terrain data get a flat horizon (0).
+    """
+    lat, lon, height = (np.atleast_1d(np.asarray(v, dtype=float)) for v in np.broadcast_arrays(lat, lon, height))
+    az = np.arange(n_az) * 360 / n_az - 180
+    dist = np.geomspace(min_dist, max_dist, n_dist)
+
+    # Sample points (S, n_az, n_dist), local flat earth around each site
+    north = -np.cos(d2r(az))[:, None] * dist
+    east = -np.sin(d2r(az))[:, None] * dist
+    lats = lat[:, None, None] + r2d(north / R_EARTH)
+    lons = lon[:, None, None] + r2d(east / (R_EARTH * np.cos(d2r(lat)))[:, None, None])
+
+    z = dem.elevation(lats, lons)
+    z -= (dem.elevation(lat, lon) + height)[:, None, None]
+    z -= (1 - REFRACTION) * dist**2 / (2 * R_EARTH) # curvature drop
+    z /= dist
+    elev = r2d(np.arctan(np.fmax.reduce(z, axis=2)))
+    return az, np.nan_to_num(elev, nan=0.)
+
+
+def _run_batch(args):
+    dem, lat, lon, height, kwargs = args
+    return horizon(dem, lat, lon, height, **kwargs)[1]
+
+
+def horizons(dem, lat, lon, height=2., workers=None, batch=16, **kwargs):
+    """
+    `horizon` of many sites, `batch` sites per task over a process pool (`workers=1`:
+    in this process). Return the azimuths (n_az,) and the elevations (S, n_az).
+    """
+    lat, lon, height = (np.atleast_1d(np.asarray(v, dtype=float)) for v in np.broadcast_arrays(lat, lon, height))
+    tasks = [(dem, lat[i:i + batch], lon[i:i + batch], height[i:i + batch], kwargs)
+             for i in range(0, len(lat), batch)]
+    if workers == 1:
+        results = list(map(_run_batch, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_run_batch, tasks))
+    n_az = kwargs.get("n_az", N_AZ)
+    return np.arange(n_az) * 360 / n_az - 180, np.concatenate(results)
+
+
+def horizon_mask(path, profile):
+    """Mask (path shape) of the timesteps when the sun is up but behind the horizon `profile`."""
+    h_az, h_elev = profile
+    return path.msk & (r2d(path.alpha) < np.interp(r2d(path.azimuth), h_az, h_elev, period=360))
+
+
+def horizon_loss(lat, profile, tilt, azimuth=0., n_hour=96):
+    """Share (0 - 1) of the yearly yield of fixed panels lost behind the horizon `profile`."""
+    path = SunPath(lat, DAYS, n_hour)
+    y = path.evaluate(tilt, azimuth)
+    hidden = horizon_mask(path, profile)
+    return (y * hidden).sum(axis=(-2, -1)) / y.sum(axis=(-2, -1))
+
+
+def write_synthetic_tiles(folder, lats=(45, 46), lons=(6, 7), n=1201, seed=0):
+    """Mountain ranges over the tiles (3 arc-second grids), for the demo."""
+    rng = np.random.default_rng(seed)
+    peaks = np.stack([rng.uniform(min(lats), max(lats) + 1, 40), rng.uniform(min(lons), max(lons) + 1, 40),
+                      rng.uniform(500, 2500, 40), rng.uniform(0.02, 0.08, 40)], axis=1)
+    for a in lats:
+        for b in lons:
+            y = (a + 1 - np.arange(n) / (n - 1))[:, None].astype(np.float32)
+            x = (b + np.arange(n) / (n - 1))[None, :].astype(np.float32)
+            z = 400 + 300 * np.sin(7 * x + 3 * y) * np.cos(5 * y)
+            for p_lat, p_lon, h, w in peaks:
+                z = z + h * np.exp(-((y - p_lat)**2 + ((x - p_lon) * 0.7)**2) / (2 * w**2))
+            z.astype(">i2").tofile(os.path.join(folder, DEM.tile_name(a, b)))
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) > 1:
+        folder = sys.argv[1]
+        names = [f for f in os.listdir(folder) if f.endswith(".hgt")]
+        corners = [((1 if f[0] == "N" else -1) * int(f[1:3]), (1 if f[3] == "E" else -1) * int(f[4:7]))
+                   for f in names]
+        lat_range = (min(c[0] for c in corners), max(c[0] for c in corners) + 1)
+        lon_range = (min(c[1] for c in corners), max(c[1] for c in corners) + 1)
+    else:
+        folder = tempfile.mkdtemp()
+        t = time.perf_counter()
+        write_synthetic_tiles(folder)
+        print("Synthetic tiles written in {:.1f} s".format(time.perf_counter() - t))
+        lat_range, lon_range = (45, 47), (6, 8)
+
+    dem = DEM(folder)
+    rng = np.random.default_rng(1)
+    n_sites = 1000
+    lat = rng.uniform(lat_range[0] + 0.2, lat_range[1] - 0.2, n_sites)
+    lon = rng.uniform(lon_range[0] + 0.2, lon_range[1] - 0.2, n_sites)
+
+    t = time.perf_counter()
+    az, elev = horizons(dem, lat, lon)
+    elapsed = time.perf_counter() - t
+    print("{} horizons ({} azimuths x {} distances) in {:.1f} s on {} cores".format(
+        n_sites, N_AZ, N_DIST, elapsed, os.cpu_count()))
+
+    t = time.perf_counter()
+    loss = np.array([horizon_loss(lat[s], (az, elev[s]), 35.) for s in range(100)])
+    elapsed = time.perf_counter() - t
+    print("Yield lost to the terrain (tilt 35°, south), 100 sites in {:.1f} s: "
+          "median {:.1f} %, P90 {:.1f} %, max {:.1f} %".format(
+              elapsed, 100 * np.median(loss), 100 * np.percentile(loss, 90), 100 * loss.max()))
+
+    if len(sys.argv) == 1:
+        shutil.rmtree(folder)
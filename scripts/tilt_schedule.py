@@ -0,0 +1,158 @@
+"""
+Seasonal tilt schedule: best tilt angles when the panel can be adjusted K times a year.
+
+`yield_day_tot.py` and `yield_day_tot_fixed.py` give the optimal tilt of one day.
+Here, the (365 x tilt) matrix of daily yields of a latitude is computed once
+(and kept in the on-disk cache), then a dynamic programming finds, for every
+K = 1 .. k_max at once, the split of the year into K periods (the year wraps
+around: a winter period can span December and January) and the tilt of each
+period maximizing the yearly yield.
+
+K = 1 is the best fixed tilt for the whole year.
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import jit_backend
+from result_cache import ResultCache
+from yield_kernel import DAYS, N_HOUR, SunPath
+
+TILTS = np.arange(0, 90, 1.)
+
+
+def daily_matrix(lat, tilts=TILTS, azimuth=0., mount="fixed", n_hour=N_HOUR, chunk=16):
+    """Daily yield (%) for each day of the year and each tilt, shape (365, n_tilt)."""
+    path = SunPath(lat, DAYS, n_hour)
+    out = np.empty((len(DAYS), len(tilts)))
+    for i in range(0, len(tilts), chunk):
+        out[:, i:i + chunk] = path.daily(path.evaluate(tilts[i:i + chunk], azimuth, mount)).T
+    return out
+
+
+def cached_matrix(lat, tilts=TILTS, azimuth=0., mount="fixed", n_hour=N_HOUR, cache=None):
+    """`daily_matrix`, read from / stored in the result cache."""
+    cache = cache or ResultCache()
+    return cache.cached("tilt_schedule_matrix",
+                        dict(lat=lat, tilts=tilts, azimuth=azimuth, mount=mount, n_hour=n_hour),
+                        lambda: {"matrix": daily_matrix(lat, tilts, azimuth, mount, n_hour)},
+                        sources=[__file__])["matrix"]
+
+
+def segment_best(P, chunk=32):
+    """
+    From the cumulated yields `P` (bounds, n_tilt): best yield `best[i, j]` and tilt
+    `best_t[i, j]` of each segment [bounds[i], bounds[j]), i < j (-inf elsewhere), and
+    best tilt `wrap_t[i, j]` of the wrapping period [bounds[j], end) + [0, bounds[i]),
+    i <= j (-1 elsewhere).
+    """
+    n = len(P)
+    best = np.full((n, n), -np.inf)
+    best_t = np.zeros((n, n), dtype=int)
+    wrap_t = np.full((n, n), -1)
+    cols = np.arange(n)
+    for i0 in range(0, n, chunk):
+        rows = np.arange(i0, min(i0 + chunk, n))[:, None]
+        seg = P[None, :] - P[rows[:, 0], None] # (rows, n, n_tilt)
+        t = seg.argmax(axis=2)
+        best_t[rows[:, 0]] = t
+        best[rows[:, 0]] = np.where(rows < cols, np.take_along_axis(seg, t[..., None], 2)[..., 0], -np.inf)
+        np.subtract(P[-1], seg, out=seg) # the wrapping period is the complement
+        wrap_t[rows[:, 0]] = np.where(rows <= cols, seg.argmax(axis=2), -1)
+    return best, best_t, wrap_t
+
+
+def schedule_step(f, best):
+    """One step of the dynamic programming: `new[j, c] = max_{i < j} f[i, c] + best[i, j]` and its argmax."""
+    new = np.full_like(f, -np.inf)
+    arg = np.zeros(f.shape, dtype=int)
+    cols = np.arange(f.shape[1])
+    for j in range(1, len(f)):
+        cand = f[:j] + best[:j, j, None]
+        arg[j] = cand.argmax(axis=0)
+        new[j] = cand[arg[j], cols]
+    return new, arg
+
+
+def optimize(matrix, k_max=12, step=1, chunk=32, backend=None):
+    """
+    Best schedules for K = 1 .. `k_max` periods, from a (days x tilt) daily yield matrix.
+
+    Period boundaries are on days multiple of `step`. Return a dict K -> (total, periods),
+    `periods` being a list of (start_day, end_day, tilt_index), end excluded;
+    the first period may wrap around the end of the year (start > end).
+    `backend`: "auto", "numba" or "numpy" (see `jit_backend.py`).
+    """
+    n_day, n_tilt = matrix.shape
+    bounds = np.arange(0, n_day, step)
+    bounds = np.append(bounds, n_day)
+    n = len(bounds)
+
+    # P[b, t]: yield from day 0 to bounds[b] with tilt t
+    P = np.vstack([np.zeros(n_tilt), np.cumsum(matrix, axis=0)])[bounds]
+
+    use_jit = jit_backend.use_jit(backend)
+    if use_jit:
+        best, best_t, wrap_t = jit_backend.segment_best(P)
+    else:
+        best, best_t, wrap_t = segment_best(P, chunk)
+
+    # The period wrapping around the year is the first segment [0, b) and the last one
+    # [b', end), with the same tilt t0: f[b, t0] is the best value up to bounds[b]
+    # with k - 1 periods in between, for each t0. Only the tilts that are the best
+    # of some wrapping period can be t0 in an optimal schedule.
+    t0s = np.unique(wrap_t[wrap_t >= 0])
+    f = P[:, t0s]
+    if use_jit:
+        best_tr = np.ascontiguousarray(best.T)
+    back = []
+    res = {}
+    for k in range(1, k_max + 1):
+        if k > 1:
+            # f_new[j, t0] = max_{i < j} f[i, t0] + best[i, j]
+            f, arg = jit_backend.schedule_step(f, best_tr) if use_jit else schedule_step(f, best)
+            back.append(arg)
+
+        closing = f + (P[-1] - P)[:, t0s] # last segment [bounds[i], end) with tilt t0
+        i, c = np.unravel_index(np.argmax(closing), closing.shape)
+        total = closing[i, c]
+
+        # Rebuild the periods backward
+        periods = []
+        j = i
+        for arg in reversed(back):
+            i_prev = arg[j, c]
+            periods.append((bounds[i_prev], bounds[j], best_t[i_prev, j]))
+            j = i_prev
+        periods.reverse()
+        periods.insert(0, (bounds[i], bounds[j], t0s[c])) # wrapping period: [bounds[i], end) + [0, bounds[j])
+        res[k] = (total, periods)
+    return res
+
+
+def format_periods(periods, tilts=TILTS):
+    return ", ".join("day {}-{}: {:.0f}°".format(s, (e - 1) % 365, tilts[t]) for s, e, t in periods)
+
+
+if __name__ == "__main__":
+
+    lat0 = float(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    t = time.perf_counter()
+    matrix = cached_matrix(lat0)
+    t_matrix = time.perf_counter() - t
+
+    optimize(matrix[:40], 2) # warm-up (numba compilation)
+    t = time.perf_counter()
+    res = optimize(matrix, 12)
+    t_dp = time.perf_counter() - t
+
+    print("Latitude {}°: matrix in {:.0f} ms, schedules K = 1..12 in {:.0f} ms ({})".format(
+        lat0, 1000 * t_matrix, 1000 * t_dp, jit_backend.resolve()))
+    ref = res[1][0]
+    for k, (total, periods) in res.items():
+        print("K = {:2d}: {:+6.2f} %".format(k, 100 * (total / ref - 1)))
+    for k in (2, 4):
+        print("K = {}: {}".format(k, format_periods(res[k][1])))
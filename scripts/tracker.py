@@ -0,0 +1,100 @@
+"""
+Horizontal single-axis and dual-axis trackers.
+
+`yield_hours_rotative.py` only models a panel turning on the ground at a fixed tilt.
+Here, for any array of sun positions (e.g. a full year from `yield_kernel.SunPath`):
+
+    - the ideal rotation angle of a horizontal single-axis tracker,
+    - the backtracking correction avoiding row-to-row shading,
+      from the ground coverage ratio (panel width / row pitch),
+    - the resulting incidence.
+
+Sun angles are in radian (elevation `alpha`, `azimuth` from south, positive west),
+tracker parameters in degree. Rotation angles are positive toward the west.
+
+Run this file to compare fixed and tracking layouts over a year.
+"""
+
+import numpy as np
+
+def d2r(x):
+    return x/180 * np.pi
+
+def r2d(x):
+    return x / np.pi * 180
+
+
+def gcr(width, pitch):
+    """Ground coverage ratio of rows of panels of `width` spaced by `pitch`."""
+    return np.asarray(width, dtype=float) / pitch
+
+
+def ideal_angle(alpha, azimuth, axis_azimuth=0.):
+    """Rotation angle (radian) putting the sun in the plane normal to the panel (true tracking)."""
+    return np.arctan2(np.cos(alpha) * np.sin(azimuth - d2r(axis_azimuth)), np.sin(alpha))
+
+
+def backtrack(angle, gcr):
+    """
+    Backtracking correction of the true-tracking `angle` (radian), flat ground.
+
+    When the shadow of a row would reach the next one (|cos angle| < gcr),
+    the panel is rotated back toward flat so that shadows just touch.
+    """
+    temp = np.minimum(np.abs(np.cos(angle)) / gcr, 1)
+    return angle - np.sign(angle) * np.arccos(temp)
+
+
+def rotation_angle(alpha, azimuth, axis_azimuth=0., max_angle=60., gcr=None):
+    """
+    Rotation angle (radian) of a horizontal single-axis tracker.
+
+    Backtracking is applied when `gcr` is given, then the angle is limited to +/- `max_angle`.
+    """
+    angle = ideal_angle(alpha, azimuth, axis_azimuth)
+    if gcr is not None:
+        angle = backtrack(angle, gcr)
+    m = d2r(max_angle)
+    return np.clip(angle, -m, m)
+
+
+def single_axis_incidence(alpha, azimuth, axis_azimuth=0., max_angle=60., gcr=None):
+    """Cosine of the incidence angle on a horizontal single-axis tracker, 0 at night."""
+    R = rotation_angle(alpha, azimuth, axis_azimuth, max_angle, gcr)
+    c = (np.sin(alpha) * np.cos(R)
+         + np.cos(alpha) * np.sin(azimuth - d2r(axis_azimuth)) * np.sin(R))
+    return np.where(alpha > 0, c.clip(0), 0.)
+
+
+def dual_axis_incidence(alpha, max_tilt=90.):
+    """
+    Cosine of the incidence angle on a dual-axis tracker, 0 at night.
+
+    The panel always faces the sun azimuth; its tilt is limited to `max_tilt`.
+    """
+    miss = (np.pi / 2 - alpha) - d2r(max_tilt)
+    return np.where(alpha > 0, np.cos(miss.clip(0)), 0.)
+
+
+if __name__ == "__main__":
+
+    from yield_kernel import SunPath
+
+    lat0 = 45
+    path = SunPath(lat0)
+
+    tilts = np.arange(0, 90, 1.)
+    fixed = path.daily(path.evaluate(tilts)).sum(axis=1)
+    print("Latitude {}°, yearly yield relative to the best fixed panel ({:.0f}° tilt):".format(
+        lat0, tilts[np.argmax(fixed)]))
+
+    ref = fixed.max()
+    layouts = [
+        ("single axis, no backtracking (*)", dict(mount="single_axis")),
+        ("single axis, backtracking, GCR 0.4", dict(mount="single_axis", gcr=0.4)),
+        ("dual axis", dict(mount="dual_axis")),
+    ]
+    for name, kw in layouts:
+        y = path.daily(path.evaluate(0., **kw)).sum()
+        print("    {:38s} {:6.1f} %".format(name, 100 * y / ref))
+    print("(*) row-to-row shading is not modelled, backtracking is what avoids it.")
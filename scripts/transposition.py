@@ -0,0 +1,124 @@
+"""
+Plane-of-array irradiance: beam, sky diffuse and ground reflected terms.
+
+The scripts only count the beam, `dni * cos(incidence)`. Transposition models
+add the diffuse light of the sky and the light reflected by the ground:
+
+    - "beam":      dni * cos(theta)
+    - "isotropic": + dhi * (1 + cos(tilt)) / 2 + albedo * ghi * (1 - cos(tilt)) / 2
+    - "haydavies": the sky diffuse is split into a circumsolar part, seen as the
+                   beam (`dhi * A * cos(theta) / sin(alpha)`), and an isotropic part
+                   (`dhi * (1 - A) * (1 + cos(tilt)) / 2`), with A = dni / extraterrestrial.
+
+All the terms that do not depend on the panel are folded into three arrays per
+timestep, so for any model:
+
+    poa = cos(theta) * K_beam + (1 + cos(tilt)) / 2 * K_sky + (1 - cos(tilt)) / 2 * K_ground
+
+and `cos(theta)` comes from the `U`, `V`, `W` terms of a `yield_kernel.SunPath`,
+as the beam alone. Adding the diffuse terms costs one scalar x array product
+and two additions per panel.
+
+Run this file to compare the run times and the yearly irradiation of each model.
+"""
+
+import time
+
+import numpy as np
+
+from pv_power import clear_sky_dhi, clear_sky_dni
+from yield_kernel import SunPath, d2r
+
+MODELS = ("beam", "isotropic", "haydavies")
+
+
+def extraterrestrial(days):
+    """Extraterrestrial normal irradiance (W/m²) for day `days` since the 1st of January."""
+    return 1367 * (1 + 0.033 * np.cos(2 * np.pi * np.asarray(days) / 365))
+
+
+def sky_terms(path, dni, dhi, albedo=0.2, model="isotropic"):
+    """Panel independent terms (K_beam, K_sky, K_ground), each of the path shape."""
+    if model not in MODELS:
+        raise ValueError("Unknown model {}, choose among {}".format(model, MODELS))
+    if model == "beam":
+        return dni, None, None
+
+    ghi = dni * path.U + dhi
+    if model == "isotropic":
+        return dni, dhi, albedo * ghi
+
+    # Hay - Davies: circumsolar share A of the diffuse, projected as the beam.
+    # sin(alpha) bounded as in pvlib, to avoid the blow up at sunrise / sunset.
+    A = dni / extraterrestrial(path.days)[:, None]
+    k_beam = dni + dhi * A / np.maximum(path.U, 0.01745)
+    return k_beam, dhi * (1 - A), albedo * ghi
+
+
+def poa_irradiance(path, tilt, azimuth=0., dni=None, dhi=None, albedo=0.2, model="isotropic", terms=None):
+    """
+    Plane-of-array irradiance (W/m²) of fixed panels over a `SunPath`.
+
+    `tilt`, `azimuth`: degree, scalars or 1D arrays (one panel each).
+    `dni`, `dhi`: path shaped arrays, clear sky when not given.
+    `terms`: output of `sky_terms`, to reuse it over several calls.
+    Return shape: path shape, with a leading panel axis if `tilt` is an array.
+    """
+    if terms is None:
+        if dni is None:
+            dni = clear_sky_dni(path.U)
+        if dhi is None:
+            dhi = clear_sky_dhi(dni, path.days[:, None])
+        terms = sky_terms(path, dni, dhi, albedo, model)
+    k_beam, k_sky, k_ground = terms
+
+    scalar = np.ndim(tilt) == 0 and np.ndim(azimuth) == 0
+    tilt, azimuth = np.broadcast_arrays(d2r(np.atleast_1d(tilt).astype(float)),
+                                        d2r(np.atleast_1d(azimuth).astype(float)))
+    cb, sb = np.cos(tilt), np.sin(tilt)
+
+    res = np.empty((len(tilt),) + path.alpha.shape)
+    tmp = np.empty(path.alpha.shape)
+    if k_sky is not None:
+        # (1 + cb) / 2 * K_sky + (1 - cb) / 2 * K_ground = S + cb * D
+        S = (k_sky + k_ground) / 2
+        D = (k_sky - k_ground) / 2
+    for i in range(len(tilt)):
+        # cos(theta) = cb * U + sb * cos(pa) * V + sb * sin(pa) * W, as `SunPath.fixed_into`
+        out = res[i]
+        np.multiply(path.U, cb[i], out=out)
+        np.multiply(path.V, sb[i] * np.cos(azimuth[i]), out=tmp)
+        out += tmp
+        np.multiply(path.W, sb[i] * np.sin(azimuth[i]), out=tmp)
+        out += tmp
+        np.maximum(out, 0., out=out)
+        out *= k_beam
+        if k_sky is not None:
+            np.multiply(D, cb[i], out=tmp)
+            out += tmp
+            out += S
+    return res[0] if scalar else res
+
+
+if __name__ == "__main__":
+
+    lat0 = 50
+    tilts = np.arange(0, 90, 1.)
+    path = SunPath(lat0)
+    dni = clear_sky_dni(path.U)
+    dhi = clear_sky_dhi(dni, path.days[:, None])
+
+    times = {}
+    yearly = {}
+    for model in MODELS:
+        poa_irradiance(path, tilts, dni=dni, dhi=dhi, model=model) # warm-up
+        t = time.perf_counter()
+        poa = poa_irradiance(path, tilts, dni=dni, dhi=dhi, model=model)
+        times[model] = time.perf_counter() - t
+        # kWh/m² over the year: mean W/m² over the day x 24 h x days
+        yearly[model] = poa.mean(axis=2).sum(axis=1) * 24 / 1000
+
+    for model in MODELS:
+        best = np.argmax(yearly[model])
+        print("{:10s} {:7.1f} ms ({:.2f} x beam), best tilt {:2.0f}° with {:.0f} kWh/m²/year".format(
+            model, 1000 * times[model], times[model] / times["beam"], tilts[best], yearly[model][best]))
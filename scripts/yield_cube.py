@@ -0,0 +1,326 @@
+"""
+Lazy labeled cube over the yield formulas.
+
+The studies are all slices of one space:
+
+    lat x mount x day x hour x tilt x azimuth
+
+whose value is the yield ratio (0 - 1) of `yield_kernel.SunPath.evaluate`.
+A `YieldCube` only records coordinates and reductions; `compute()` evaluates it
+block by block (one latitude and one mount at a time, a chunk of days at a time)
+and applies the reductions on each block, so the full array is never built.
+
+Reductions on the day axis are accumulated over the chunks of days
+(sum, mean, max, min, argmax, argmin, and grouped sum / mean, e.g. by month).
+Reductions on `lat` and `mount` must come after the other ones.
+
+Example, optimal tilt per latitude per month:
+
+    cube = YieldCube(lat=[30, 40, 50], tilt=np.arange(90))
+    res = cube.sum("hour").sum("day", by=MONTH, name="month").argmax("tilt").compute()
+    res.dims               # ('lat', 'mount', 'month', 'azimuth'), mount and azimuth of length 1
+    res.values[:, 0, :, 0] # (lat, month) array of tilts
+"""
+
+import numpy as np
+
+from yield_kernel import DAYS, SunPath
+
+DIMS = ("lat", "mount", "day", "hour", "tilt", "azimuth")
+BLOCK = ("day", "hour", "tilt", "azimuth") # dims evaluated together for a (lat, mount)
+OPS = ("sum", "mean", "max", "min", "argmax", "argmin")
+
+# Month (0 - 11) of each day of the year
+MONTH = np.repeat(np.arange(12), [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+class Labeled:
+    """Result of a cube: `values` with named `dims` and their `coords`."""
+
+    def __init__(self, values, dims, coords):
+        self.values = values
+        self.dims = tuple(dims)
+        self.coords = dict(coords)
+
+    def __repr__(self):
+        shape = ", ".join("{}: {}".format(d, n) for d, n in zip(self.dims, np.shape(self.values)))
+        return "Labeled({})".format(shape)
+
+
+def _reduce(values, dims, coords, op, dim, by=None, name=None):
+    """Apply one reduction to a labeled array, return (values, dims, coords)."""
+    ax = dims.index(dim)
+    dims = list(dims)
+    coords = dict(coords)
+
+    if by is not None:
+        groups, inv = np.unique(by, return_inverse=True)
+        shape = list(values.shape)
+        shape[ax] = len(groups)
+        out = np.zeros(shape)
+        np.add.at(out, (slice(None),) * ax + (inv,), values)
+        if op == "mean":
+            out /= np.bincount(inv, minlength=len(groups)).reshape([-1] + [1] * (len(shape) - ax - 1))
+        dims[ax] = name or dim
+        del coords[dim]
+        coords[dims[ax]] = groups
+        return out, dims, coords
+
+    if op in ("argmax", "argmin"):
+        idx = getattr(np, op)(values, axis=ax)
+        out = coords[dim][idx]
+    else:
+        out = getattr(np, op)(values, axis=ax)
+    del dims[ax]
+    del coords[dim]
+    return out, dims, coords
+
+
+class _Accumulator:
+    """Running reduction `op` of the day axis (`axis`) over chunks of days."""
+
+    def __init__(self, op, by, coord, axis):
+        self.op = op
+        self.by = by
+        self.coord = coord
+        self.axis = axis
+        self.value = None
+        self.index = None
+        self.count = 0
+
+    def add(self, values, start):
+        ax = self.axis
+        n = values.shape[ax]
+        if self.by is not None:
+            groups = np.unique(self.by)
+            inv = np.searchsorted(groups, self.by[start:start + n])
+            shape = list(values.shape)
+            shape[ax] = len(groups)
+            part = np.zeros(shape)
+            np.add.at(part, (slice(None),) * ax + (inv,), values)
+            self.value = part if self.value is None else self.value + part
+        elif self.op in ("sum", "mean"):
+            part = values.sum(axis=ax)
+            self.value = part if self.value is None else self.value + part
+        elif self.op in ("max", "min"):
+            part = getattr(np, self.op)(values, axis=ax)
+            self.value = part if self.value is None else getattr(np, self.op + "imum")(self.value, part)
+        else:
+            idx = getattr(np, self.op)(values, axis=ax)
+            part = np.take_along_axis(values, np.expand_dims(idx, ax), ax).squeeze(ax)
+            if self.value is None:
+                self.value, self.index = part, idx + start
+            else:
+                better = part > self.value if self.op == "argmax" else part < self.value
+                self.value = np.where(better, part, self.value)
+                self.index = np.where(better, idx + start, self.index)
+        self.count += n
+
+    def result(self):
+        if self.by is not None:
+            if self.op == "mean":
+                counts = np.unique(self.by, return_counts=True)[1]
+                shape = [1] * self.value.ndim
+                shape[self.axis] = len(counts)
+                return self.value / counts.reshape(shape)
+            return self.value
+        if self.op == "mean":
+            return self.value / self.count
+        if self.op in ("argmax", "argmin"):
+            return self.coord[self.index]
+        return self.value
+
+
+class YieldCube:
+    """
+    Lazy cube of yield ratios. Coordinates (1D, degree / hours / day numbers):
+
+        - lat, tilt, azimuth
+        - day (0 - 364), hour (solar hours, 0 - 24)
+        - mount: names of `yield_kernel.MOUNTS`
+    """
+
+    def __init__(self, lat=(50,), mount=("fixed",), day=DAYS, hour=np.linspace(0, 24, 200),
+                 tilt=(0,), azimuth=(0,), reductions=()):
+        self.coords = {
+            "lat": np.atleast_1d(np.asarray(lat, dtype=float)),
+            "mount": np.atleast_1d(np.asarray(mount)),
+            "day": np.atleast_1d(np.asarray(day)),
+            "hour": np.atleast_1d(np.asarray(hour, dtype=float)),
+            "tilt": np.atleast_1d(np.asarray(tilt, dtype=float)),
+            "azimuth": np.atleast_1d(np.asarray(azimuth, dtype=float)),
+        }
+        self.reductions = tuple(reductions)
+        self._check()
+
+    def _check(self):
+        dims = list(DIMS)
+        outer_reduced = False
+        for op, dim, by, name in self.reductions:
+            if op not in OPS:
+                raise ValueError("Unknown reduction {}, choose among {}".format(op, OPS))
+            if dim not in dims:
+                raise ValueError("Dimension {} is not in the cube {}".format(dim, dims))
+            if by is not None and (dim != "day" or op not in ("sum", "mean")):
+                raise ValueError("Grouped reductions are only available as sum / mean over day")
+            if dim in ("lat", "mount"):
+                outer_reduced = True
+            elif outer_reduced:
+                raise ValueError("Reductions on lat / mount must come after the other ones")
+            if by is None:
+                dims.remove(dim)
+            else:
+                dims[dims.index(dim)] = name or dim
+
+    @property
+    def dims(self):
+        dims = list(DIMS)
+        for op, dim, by, name in self.reductions:
+            if by is None:
+                dims.remove(dim)
+            else:
+                dims[dims.index(dim)] = name or dim
+        return tuple(dims)
+
+    @property
+    def shape(self):
+        """Shape of the (never built) cube before the reductions."""
+        return tuple(len(self.coords[d]) for d in DIMS)
+
+    def _new(self, reductions):
+        return YieldCube(reductions=reductions, **self.coords)
+
+    def sel(self, **coords):
+        """Cube restricted to the given coordinate values (the reductions are kept)."""
+        new = dict(self.coords)
+        for dim, values in coords.items():
+            values = np.atleast_1d(values)
+            missing = np.setdiff1d(values, self.coords[dim])
+            if len(missing):
+                raise KeyError("{} not in the {} coordinates".format(missing, dim))
+            new[dim] = values
+        return YieldCube(reductions=self.reductions, **new)
+
+    def reduce(self, op, dim, by=None, name=None):
+        """Lazy reduction `op` over `dim`. `by`: group labels of the days (e.g. `MONTH[day]`)."""
+        if by is not None:
+            by = np.asarray(by)
+            if len(by) != len(self.coords["day"]):
+                raise ValueError("`by` must give one label per day")
+        return self._new(self.reductions + ((op, dim, by, name),))
+
+    def sum(self, dim, by=None, name=None):
+        return self.reduce("sum", dim, by, name)
+
+    def mean(self, dim, by=None, name=None):
+        return self.reduce("mean", dim, by, name)
+
+    def max(self, dim):
+        return self.reduce("max", dim)
+
+    def min(self, dim):
+        return self.reduce("min", dim)
+
+    def argmax(self, dim):
+        """Coordinate value (e.g. tilt) of the maximum along `dim`."""
+        return self.reduce("argmax", dim)
+
+    def argmin(self, dim):
+        return self.reduce("argmin", dim)
+
+    def _block(self, lat, mount, days):
+        """Raw values (day, hour, tilt, azimuth) of one block."""
+        c = self.coords
+        tilt, azimuth = np.meshgrid(c["tilt"], c["azimuth"], indexing="ij")
+        path = SunPath(lat, days, hours=c["hour"])
+        res = path.evaluate(tilt.ravel(), azimuth.ravel(), mount=mount) # (panel, day, hour)
+        res = res.reshape(len(c["tilt"]), len(c["azimuth"]), len(days), len(c["hour"]))
+        return res.transpose(2, 3, 0, 1)
+
+    def _chunk_days(self, max_bytes):
+        per_day = 8 * len(self.coords["hour"]) * len(self.coords["tilt"]) * len(self.coords["azimuth"])
+        return max(1, int(max_bytes // (4 * per_day))) # room for the temporaries of evaluate
+
+    def compute(self, max_bytes=64 * 2**20):
+        """Evaluate the cube, with blocks of at most about `max_bytes`. Return a `Labeled`."""
+        c = self.coords
+        inner = [r for r in self.reductions if r[1] not in ("lat", "mount")]
+        outer = [r for r in self.reductions if r[1] in ("lat", "mount")]
+
+        # Split the inner reductions around the first one on the day axis:
+        # the ones before are exact on each chunk of days, that one is accumulated,
+        # the ones after are applied once all the chunks are done.
+        k = next((i for i, r in enumerate(inner) if r[1] == "day"), None)
+        chunk = self._chunk_days(max_bytes)
+        days = c["day"]
+
+        block_dims = list(BLOCK)
+        block_coords = {d: c[d] for d in BLOCK}
+
+        results = []
+        for lat in c["lat"]:
+            row = []
+            for mount in c["mount"]:
+                parts = []
+                acc = None
+                for start in range(0, len(days), chunk):
+                    values = self._block(lat, mount, days[start:start + chunk])
+                    dims = list(block_dims)
+                    coords = dict(block_coords, day=days[start:start + chunk])
+                    for op, dim, by, name in (inner if k is None else inner[:k]):
+                        values, dims, coords = _reduce(values, dims, coords, op, dim, by, name)
+
+                    if k is None:
+                        parts.append(values)
+                        continue
+                    op, dim, by, name = inner[k]
+                    if acc is None:
+                        acc = _Accumulator(op, by, days, dims.index("day"))
+                    acc.add(values, start)
+
+                if k is None:
+                    ax = dims.index("day")
+                    values = np.concatenate(parts, axis=ax)
+                    coords["day"] = days
+                else:
+                    op, dim, by, name = inner[k]
+                    values = acc.result()
+                    ax = dims.index("day")
+                    if by is None:
+                        del dims[ax]
+                        del coords["day"]
+                    else:
+                        dims[ax] = name or "day"
+                        del coords["day"]
+                        coords[dims[ax]] = np.unique(by)
+                    for op, dim, by, name in inner[k + 1:]:
+                        values, dims, coords = _reduce(values, dims, coords, op, dim, by, name)
+                row.append(values)
+            results.append(row)
+
+        values = np.array(results)
+        dims = ["lat", "mount"] + dims
+        coords = dict(coords, lat=c["lat"], mount=c["mount"])
+        for op, dim, by, name in outer:
+            values, dims, coords = _reduce(values, dims, coords, op, dim, by, name)
+        return Labeled(values, dims, coords)
+
+
+if __name__ == "__main__":
+
+    import time
+
+    lats = np.arange(0, 70, 10)
+    cube = YieldCube(lat=lats, tilt=np.arange(0, 90, 1), azimuth=[0], hour=np.linspace(0, 24, 96))
+    print("Cube shape", dict(zip(DIMS, cube.shape)), "= {:.1f} M values".format(np.prod(cube.shape) / 1e6))
+
+    t = time.perf_counter()
+    res = (cube.mean("hour")
+               .sum("day", by=MONTH, name="month")
+               .argmax("tilt")
+               .compute())
+    print("Optimal tilt per latitude per month, in {:.2f} s".format(time.perf_counter() - t))
+
+    print("lat  " + " ".join("{:>4d}".format(m + 1) for m in res.coords["month"]))
+    for lat, row in zip(lats, res.values[:, 0, :, 0]):
+        print("{:3.0f}  ".format(lat) + " ".join("{:4.0f}".format(v) for v in row))
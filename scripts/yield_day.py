@@ -6,13 +6,10 @@ f(day, latitude)
 The yield is independent of the day length (i.e. it is relative to the day period)
 """
 
-from bokeh.plotting  import ColumnDataSource, figure, output_file, show
-from bokeh.models    import HoverTool, CustomJS,  Slider
-from bokeh.layouts   import column
-
-
 import numpy as np
 
+from profiling import profiler
+
 def d2r(x):
     return x/180 * np.pi
 
@@ -21,6 +18,12 @@ def r2d(x):
 
 
 if __name__ == "__main__":
+    from bokeh.plotting  import ColumnDataSource, figure, output_file, show
+    from bokeh.models    import HoverTool, CustomJS,  Slider
+    from bokeh.layouts   import column
+
+    profiler.enable_from_argv()
+
     
 
     # Default value to initialize the plot
@@ -33,16 +36,20 @@ if __name__ == "__main__":
     hra    = d2r(15 * (hours - 12)) 
     beta   = np.arange(90)
 
+    profiler.start("sun_position")
     A = np.sin(d2r(gamma0)) * np.sin(d2r(lat0))
     B = np.cos(d2r(gamma0)) * np.cos(d2r(lat0)) 
     angles = np.arcsin(A + B * np.cos(hra))
     angles = angles[angles >= 0]
 
+    profiler.start("yield_kernel")
     vals = []
     for b in beta:
         vals.append(100 * (np.sin(d2r(b) + angles).clip(0).mean()))
 
+    profiler.start("reduction")
     b_max    = beta[np.argmax(vals)]
+    profiler.start("bokeh_model")
     source   = ColumnDataSource(data=dict(x=beta, y=vals, xx=d2r(beta)))
     source_t = ColumnDataSource(data=dict(t=hra))
     source_m = ColumnDataSource(data=dict(x=[b_max, b_max], y=[0, np.max(vals)])) # Max line
@@ -131,7 +138,9 @@ if __name__ == "__main__":
     p.xgrid.ticker = [i*5 for i in range(19)]
     p.xaxis.ticker = [i*5 for i in range(19)]
 
+    profiler.start("save")
     output_file("../html/sun_yield_day_fixed_panel.html", title="Average Yield over a day.")
     show(column(p, slider_lat, slider_day))
+    profiler.report()
     
 
@@ -2,12 +2,10 @@
 Similar to the `yield_hours_angle` but take into account day length.
 """
 
-from bokeh.plotting  import ColumnDataSource, figure, output_file, show
-from bokeh.models    import HoverTool, CustomJS, Slider
-from bokeh.layouts   import column
-
 import numpy as np
 
+from profiling import profiler
+
 def d2r(x):
     return x/180 * np.pi
 
@@ -16,6 +14,12 @@ def r2d(x):
 
 
 if __name__ == "__main__":
+    from bokeh.plotting  import ColumnDataSource, figure, output_file, show
+    from bokeh.models    import HoverTool, CustomJS, Slider
+    from bokeh.layouts   import column
+
+    profiler.enable_from_argv()
+
 
     lat0  = 50
     day0 = 30
@@ -26,16 +30,20 @@ if __name__ == "__main__":
     hra    = d2r(15 * (hours - 12)) 
     beta = np.arange(90)
 
+    profiler.start("sun_position")
     A = np.sin(d2r(gamma0)) * np.sin(d2r(lat0))
     B = np.cos(d2r(gamma0)) * np.cos(d2r(lat0)) 
     angles = np.arcsin(A + B * np.cos(hra))
     angles = angles[angles >= 0]
 
+    profiler.start("yield_kernel")
     vals = []
     for b in beta:
         vals.append(100 * (np.sin(d2r(b) + angles).clip(0).sum() / len(hra)))
 
+    profiler.start("reduction")
     b_max = beta[np.argmax(vals)]
+    profiler.start("bokeh_model")
     source = ColumnDataSource(data=dict(x=beta, y=vals, xx=d2r(beta)))
     source_t = ColumnDataSource(data=dict(t=hra))
     source_m = ColumnDataSource(data=dict(x=[b_max, b_max], y=[0, np.max(vals)])) # Max line
@@ -122,7 +130,9 @@ if __name__ == "__main__":
     p.xgrid.ticker = [i*5 for i in range(19)]
     p.xaxis.ticker = [i*5 for i in range(19)]
 
+    profiler.start("save")
     output_file("../html/sun_yield_day_fixed_panel_time.html", title="Average Yield over a day.")
     show(column(p, slider_lat, slider_day))
+    profiler.report()
     
 
@@ -6,12 +6,13 @@ Total yield over a day for a non-rotative solar panel.
 
 """
 
-from bokeh.plotting  import ColumnDataSource, figure, output_file, show
-from bokeh.models    import HoverTool, CustomJS, Slider
-from bokeh.layouts   import column
-
 import numpy as np
 
+import jit_backend
+from result_cache import ResultCache
+from yield_kernel import SunPath, Workspace, hour_angles
+from profiling import profiler
+
 def d2r(x):
     return x/180 * np.pi
 
@@ -21,11 +22,36 @@ def r2d(x):
 N_HOUR = 200
 N_BETA = 200
 
+
+def day_yield_fixed(lat0, day0, beta, n_hour=N_HOUR, backend=None):
+    """
+    Total yield (%) over day `day0` of a fixed panel, for each tilt angle of `beta`.
+    `backend`: "auto", "numba" or "numpy" (see `jit_backend.py`).
+    """
+    if jit_backend.use_jit(backend):
+        # Sun angles and yields in one compiled loop (and the compilation on the first call)
+        with profiler.stage("jit_kernel"):
+            return jit_backend.day_yield_fixed(lat0, day0, beta, hour_angles(n_hour))
+
+    path = SunPath(lat0, [day0], n_hour)
+    ws = Workspace(path)
+    Yield = np.empty(path.alpha.shape)
+    vals = np.empty((len(beta), 1))
+    for i, b in enumerate(beta):
+        path.daily_into(path.fixed_south_into(b, Yield, ws), vals[i])
+    return vals[:, 0]
+
+
 if __name__ == "__main__":
+    from bokeh.plotting  import ColumnDataSource, figure, output_file, show
+    from bokeh.models    import HoverTool, CustomJS, Slider
+    from bokeh.layouts   import column
+
+    profiler.enable_from_argv()
+
 
     lat0  = 50
     day0 = 30
-    gamma0 =  23.433333 * np.sin(2 * np.pi * (day0 + 284) / 365);
 
 
     hours = np.linspace(0, 24, N_HOUR)
@@ -36,31 +62,16 @@ if __name__ == "__main__":
     beta = np.linspace(0, 90, N_BETA)
     beta_r = d2r(beta)
 
-    A = np.sin(d2r(gamma0)) * np.sin(d2r(lat0))
-    B = np.cos(d2r(gamma0)) * np.cos(d2r(lat0)) 
-    alpha = np.arcsin(A + B * np.cos(hra))
-    msk = alpha >= 0
-
-    
-    TH = np.tan(hra)
-    TA = np.tan(alpha.clip(0))
-    X = 1 + TH**2 + TA**2
-
-    vals = []
-    for cb, sb in zip(np.cos(beta_r), np.sin(beta_r)):
-
-        Y = sb * TA - cb * CH
-        X = 1 + TA**2
-
-        V_A = np.sqrt(1 - SH**2/X)
-        V_B = np.sqrt(1 - Y**2/X)
-        V_AB = Y*SH/X
-
-        Yield = np.sqrt(1 - (V_AB / (V_A * V_B))**2) * V_B * V_A
-        vals.append(100 * Yield[msk].sum() / len(hra))
-        
+    profiler.start("yield_kernel")
+    # Yield for each tilt angle (cached on disk)
+    vals = ResultCache().cached("yield_day_tot_fixed",
+            dict(lat=lat0, day=day0, beta=beta, n_hour=N_HOUR),
+            lambda: {"vals": day_yield_fixed(lat0, day0, beta)},
+            sources=[__file__])["vals"]
         
+    profiler.start("reduction")
     b_max = beta[np.argmax(vals)]
+    profiler.start("bokeh_model")
     source = ColumnDataSource(data=dict(x=beta, y=vals, cb=np.cos(beta_r), sb=np.sin(beta_r)))
     source_t = ColumnDataSource(data=dict(t=hra, ch=CH, sh=SH))
     source_m = ColumnDataSource(data=dict(x=[b_max, b_max], y=[0, np.max(vals)])) # Max line
@@ -163,7 +174,9 @@ if __name__ == "__main__":
     p.xgrid.ticker = [i*5 for i in range(19)]
     p.xaxis.ticker = [i*5 for i in range(19)]
 
+    profiler.start("save")
     output_file("../html/yield_day_fixed_panel_norot.html", title="Average Yield over a day for fixed panel.")
     show(column(p, slider_lat, slider_day))
+    profiler.report()
     
 
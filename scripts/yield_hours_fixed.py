@@ -7,12 +7,10 @@ Compute the yield hour after hour for a given date/latitude.
 
 """
 
-from bokeh.plotting  import ColumnDataSource, figure, output_file, show
-from bokeh.models    import  HoverTool, CustomJS, Slider
-from bokeh.layouts   import column
-
 import numpy as np
 
+from profiling import profiler
+
 def d2r(x):
     return x/180 * np.pi
 
@@ -22,6 +20,12 @@ def r2d(x):
 N = 500
 
 if __name__ == "__main__":
+    from bokeh.plotting  import ColumnDataSource, figure, output_file, show
+    from bokeh.models    import  HoverTool, CustomJS, Slider
+    from bokeh.layouts   import column
+
+    profiler.enable_from_argv()
+
     
     lat0  = 50
     day0 = 30
@@ -29,11 +33,13 @@ if __name__ == "__main__":
     gamma0 =  23.433333 * np.sin(2 * np.pi * (day0 + 284) / 365);
 
 
+    profiler.start("sun_position")
     hours = np.linspace(0, 24, N)
     hra    = d2r(15 * (hours - 12))
     alpha = np.arcsin(np.sin(d2r(gamma0)) * np.sin(d2r(lat0)) 
                       + np.cos(d2r(gamma0)) * np.cos(d2r(lat0)) * np.cos(hra))
 
+    profiler.start("yield_kernel")
     r_beta = d2r(beta)
     CB = np.cos(r_beta)
     SB = np.sin(r_beta)
@@ -55,6 +61,7 @@ if __name__ == "__main__":
 
     
     
+    profiler.start("bokeh_model")
     source = ColumnDataSource(data=dict(x=hours, y=100*Yield, h=hra, ch=CH, sh=SH))
     
 
@@ -143,7 +150,9 @@ if __name__ == "__main__":
     p.xgrid.ticker = [i for i in range(25)]
     p.xaxis.ticker = [i*3 for i in range(9)]
 
+    profiler.start("save")
     output_file("../html/yield_fixed_tilt.html", title="Yield for a fixed solar panel facing south.")
     show(column(p, slider_lat, slider_day, slider_panel))
+    profiler.report()
     
 
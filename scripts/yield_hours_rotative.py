@@ -8,12 +8,10 @@ Compute the yield for a date at a given latitude over the time
 
 """
 
-from bokeh.plotting  import ColumnDataSource, figure, output_file, show
-from bokeh.models    import  HoverTool, CustomJS, Slider
-from bokeh.layouts   import column
-
 import numpy as np
 
+from profiling import profiler
+
 def d2r(x):
     return x/180 * np.pi
 
@@ -22,17 +20,25 @@ def r2d(x):
 
 
 if __name__ == "__main__":
+    from bokeh.plotting  import ColumnDataSource, figure, output_file, show
+    from bokeh.models    import  HoverTool, CustomJS, Slider
+    from bokeh.layouts   import column
+
+    profiler.enable_from_argv()
+
     
     lat0  = 50
     day0 = 30
     gamma0 =  23.433333 * np.sin(2 * np.pi * (day0 + 284) / 365);
 
 
+    profiler.start("sun_position")
     hours = np.linspace(0, 24, 200)
     hra    = 15 * (hours - 12) 
     angles = np.arcsin(np.sin(d2r(gamma0)) * np.sin(d2r(lat0)) 
                       + np.cos(d2r(gamma0)) * np.cos(d2r(lat0)) * np.cos(d2r(hra)))
 
+    profiler.start("bokeh_model")
     source = ColumnDataSource(data=dict(x=hours, y=100*np.sin(angles), h=hra*np.pi/180 ))
 
     # Slider lat
@@ -100,7 +106,9 @@ if __name__ == "__main__":
     p.xgrid.ticker = [i for i in range(25)]
     p.xaxis.ticker = [i*3 for i in range(9)]
 
+    profiler.start("save")
     output_file("../html/yield_rotative_fixed_tilt.html", title="Rotative solar panel yield.")
     show(column(p, slider_lat, slider_day, slider_panel))
+    profiler.report()
     
 
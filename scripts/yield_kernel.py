@@ -0,0 +1,368 @@
+"""
+Vectorized yield kernels.
+
+Same equations as the bokeh scripts (simple declination, solar hours,
+hour angle sampled over the 24 hours), written to work on whole arrays
+of days / hours / panels at once, and importable without bokeh.
+
+Angles are in radian inside the kernels, azimuths are measured from
+the south, positive toward the west.
+"""
+
+import numpy as np
+
+import tracker
+from profiling import profiler
+
+def d2r(x):
+    return x/180 * np.pi
+
+def r2d(x):
+    return x / np.pi * 180
+
+N_HOUR = 200
+DAYS = np.arange(365)
+
+
+def declination(N):
+    """Sun declination (degree) for day `N` since the 1st of January."""
+    return 23.433333 * np.sin(2 * np.pi * (np.asarray(N) + 284) / 365)
+
+
+def hour_angles(n_hour=N_HOUR):
+    """Hour angles (radian) sampled over the day, as in the scripts."""
+    hours = np.linspace(0, 24, n_hour)
+    return d2r(15 * (hours - 12))
+
+
+def sun_angles(lat, N, hra):
+    """
+    Sun elevation and azimuth (radian) for latitude `lat` (degree), day `N`, hour angle `hra`.
+    Inputs are broadcast together.
+    """
+    gamma = d2r(declination(N))
+    L = d2r(np.asarray(lat, dtype=float))
+
+    alpha = np.arcsin(np.sin(gamma) * np.sin(L) + np.cos(gamma) * np.cos(L) * np.cos(hra))
+    azimuth = np.arctan2(np.sin(hra) * np.cos(gamma),
+                         np.cos(hra) * np.cos(gamma) * np.sin(L) - np.sin(gamma) * np.cos(L))
+    return alpha, azimuth
+
+
+def incidence(alpha, azimuth, tilt, panel_azimuth=0.):
+    """
+    Cosine of the incidence angle of the beam on a panel (`tilt`, `panel_azimuth` in radian).
+    Clipped to 0 when the sun is behind the panel or below the horizon.
+    """
+    c = (np.sin(alpha) * np.cos(tilt)
+         + np.cos(alpha) * np.sin(tilt) * np.cos(azimuth - panel_azimuth))
+    return np.where(alpha > 0, c.clip(0), 0.)
+
+
+@profiler.wrap("yield_kernel")
+def daily_yield(lat, tilt, panel_azimuth, n_hour=N_HOUR, days=DAYS, chunk=64):
+    """
+    Daily yield of fixed panels sharing one latitude.
+
+    `tilt` and `panel_azimuth` are 1D arrays (degree) of length C.
+    Return an array (C, len(days)) in full-sun hours, i.e. kWh per kW of
+    panel under a 1000 W/m² beam (no atmosphere, as in the scripts).
+    """
+    hra = hour_angles(n_hour)
+    alpha, azimuth = sun_angles(lat, days[:, None], hra[None, :])
+    up = alpha > 0
+
+    # cos(theta) = cb * U + sb * cos(pa) * V + sb * sin(pa) * W
+    # so a chunk of panels is a single matrix product.
+    ca = np.where(up, np.cos(alpha), 0.)
+    U = np.where(up, np.sin(alpha), 0.).ravel()
+    V = (ca * np.cos(azimuth)).ravel()
+    W = (ca * np.sin(azimuth)).ravel()
+    UVW = np.stack([U, V, W])
+
+    tilt = d2r(np.atleast_1d(np.asarray(tilt, dtype=float)))
+    pa = d2r(np.atleast_1d(np.asarray(panel_azimuth, dtype=float)))
+    coef = np.stack([np.cos(tilt),
+                     np.sin(tilt) * np.cos(pa),
+                     np.sin(tilt) * np.sin(pa)], axis=1)
+
+    dt = 24 / n_hour
+    out = np.empty((len(coef), len(days)))
+    for i in range(0, len(coef), chunk):
+        c = coef[i:i + chunk] @ UVW
+        c.clip(0, out=c)
+        out[i:i + chunk] = c.reshape(len(c), len(days), n_hour).sum(axis=2) * dt
+    return out
+
+
+MOUNTS = ("fixed", "fixed_south", "rotative", "flat", "single_axis", "dual_axis")
+
+
+class SunPath:
+    """
+    Sun path of one site over a set of days, computed once.
+
+    Holds the per-timestep arrays (shape (n_days, n_hour)) that only depend on
+    the latitude and the day: `alpha`, `azimuth`, `TA`, `SH`, `CH`, `msk`.
+    Evaluating a panel against it only costs the incidence step.
+    """
+
+    @profiler.wrap("sun_position")
+    def __init__(self, lat, days=DAYS, n_hour=N_HOUR, hours=None):
+        """`hours` (solar hours, 0 - 24) replaces the `n_hour` regular samples when given."""
+        self.lat = lat
+        self.days = np.atleast_1d(days)
+        if hours is None:
+            self.hra = hour_angles(n_hour)
+        else:
+            self.hra = d2r(15 * (np.atleast_1d(np.asarray(hours, dtype=float)) - 12))
+        self.n_hour = len(self.hra)
+
+        self.alpha, self.azimuth = sun_angles(lat, self.days[:, None], self.hra[None, :])
+        self.msk = self.alpha >= 0
+
+        self.TA = np.tan(self.alpha.clip(0))
+        # Full (contiguous) arrays: ufuncs on broadcast views allocate iteration buffers
+        self.SH = np.sin(self.hra) * np.ones_like(self.alpha)
+        self.CH = np.cos(self.hra) * np.ones_like(self.alpha)
+
+        self.sin_alpha = np.sin(self.alpha)
+        self.cos_alpha = np.cos(self.alpha)
+        self.night = ~self.msk
+        self._ones = np.ones(self.n_hour)
+
+        # Tilt independent terms of the kernels
+        self.X = 1 + self.TA**2
+        self.V_A = np.sqrt(1 - self.SH**2/self.X)
+        self.U = np.where(self.msk, self.sin_alpha, 0.)
+        self.V = np.where(self.msk, self.cos_alpha * np.cos(self.azimuth), 0.)
+        self.W = np.where(self.msk, self.cos_alpha * np.sin(self.azimuth), 0.)
+
+    @profiler.wrap("yield_kernel")
+    def evaluate(self, tilt, azimuth=0., mount="fixed", gcr=None, max_angle=60.):
+        """
+        Yield ratio (0 - 1) per timestep, 0 at night.
+
+        `tilt` and `azimuth` in degree, scalars or 1D arrays (one panel each).
+        Mount types:
+            - "fixed":       cosine of the incidence angle, any azimuth
+            - "fixed_south": formula of `yield_hours_fixed.py` (south facing)
+            - "rotative":    panel rotating on the ground, `sin(alpha + tilt)` (`yield_year.py`)
+            - "flat":        `sin(alpha)`
+            - "single_axis": horizontal tracker, `azimuth` is the axis azimuth, `tilt` is unused.
+                             Rotation limited to `max_angle`, backtracking when `gcr` is given.
+            - "dual_axis":   tracker facing the sun, tilt limited to `max_angle` (90 = no limit)
+        Return shape: path shape, with a leading panel axis if `tilt` is an array.
+        """
+        if mount not in MOUNTS:
+            raise ValueError("Unknown mount {}, choose among {}".format(mount, MOUNTS))
+
+        scalar = np.ndim(tilt) == 0 and np.ndim(azimuth) == 0
+        tilt, azimuth = np.broadcast_arrays(d2r(np.atleast_1d(tilt).astype(float)),
+                                            d2r(np.atleast_1d(azimuth).astype(float)))
+        cb = np.cos(tilt)[:, None, None]
+        sb = np.sin(tilt)[:, None, None]
+
+        if mount == "fixed":
+            res = (self.sin_alpha * cb
+                   + self.cos_alpha * sb * np.cos(self.azimuth - azimuth[:, None, None]))
+            res = res.clip(0)
+        elif mount == "fixed_south":
+            Y = sb * self.TA - cb * self.CH
+            X = 1 + self.TA**2
+
+            with np.errstate(divide="ignore", invalid="ignore"): # night values are masked below
+                V_A = np.sqrt(1 - self.SH**2/X)
+                V_B = np.sqrt(1 - Y**2/X)
+                V_AB = Y*self.SH/X
+
+                res = np.sqrt(1 - (V_AB / (V_A * V_B))**2) * V_B * V_A
+        elif mount == "rotative":
+            res = np.sin(tilt[:, None, None] + self.alpha).clip(0)
+        elif mount == "single_axis":
+            res = tracker.single_axis_incidence(self.alpha, self.azimuth, r2d(azimuth[:, None, None]),
+                                                max_angle, gcr)
+        elif mount == "dual_axis":
+            res = np.broadcast_to(tracker.dual_axis_incidence(self.alpha, max_angle),
+                                  (len(tilt),) + self.alpha.shape)
+        else:
+            res = np.broadcast_to(self.sin_alpha.clip(0), (len(tilt),) + self.alpha.shape)
+
+        res = np.where(self.msk, res, 0.)
+        return res[0] if scalar else res
+
+    def fixed_south_into(self, tilt, out, ws):
+        """
+        Same as `evaluate(tilt, mount="fixed_south")` for one tilt (degree), written
+        into `out` (path shape) using the buffers of `ws` (a `Workspace`): no allocation.
+        """
+        cb = np.cos(d2r(tilt))
+        sb = np.sin(d2r(tilt))
+        Y, V_B, V_AB, tmp = ws.Y, ws.V_B, ws.V_AB, ws.tmp
+
+        # Y = sb * TA - cb * CH
+        np.multiply(self.TA, sb, out=Y)
+        np.multiply(self.CH, cb, out=tmp)
+        np.subtract(Y, tmp, out=Y)
+
+        # Only day time values are computed (`where=`), night values are set to 0 below
+        day = self.msk
+
+        # V_B = sqrt(1 - Y**2/X)
+        np.square(Y, out=tmp)
+        np.divide(tmp, self.X, out=tmp)
+        np.subtract(1, tmp, out=tmp)
+        np.sqrt(tmp, out=V_B, where=day)
+
+        # V_AB = Y*SH/X
+        np.multiply(Y, self.SH, out=V_AB)
+        np.divide(V_AB, self.X, out=V_AB)
+
+        # Yield = sqrt(1 - (V_AB / (V_A * V_B))**2) * V_B * V_A
+        np.multiply(self.V_A, V_B, out=tmp, where=day)
+        np.divide(V_AB, tmp, out=tmp, where=day)
+        np.square(tmp, out=tmp, where=day)
+        np.subtract(1, tmp, out=tmp, where=day)
+        np.sqrt(tmp, out=out, where=day)
+        np.multiply(out, V_B, out=out, where=day)
+        np.multiply(out, self.V_A, out=out, where=day)
+
+        np.copyto(out, 0., where=self.night)
+        return out
+
+    def fixed_into(self, tilt, azimuth, out, ws):
+        """
+        Same as `evaluate(tilt, azimuth, mount="fixed")` for one panel (degree), written
+        into `out` (path shape) using the buffers of `ws` (a `Workspace`): no allocation.
+        """
+        cb = np.cos(d2r(tilt))
+        sb = np.sin(d2r(tilt))
+        pa = d2r(azimuth)
+
+        # cos(theta) = cb * sin(alpha) + sb * cos(alpha) * cos(azimuth - pa)
+        np.multiply(self.U, cb, out=out)
+        np.multiply(self.V, sb * np.cos(pa), out=ws.tmp)
+        np.add(out, ws.tmp, out=out)
+        np.multiply(self.W, sb * np.sin(pa), out=ws.tmp)
+        np.add(out, ws.tmp, out=out)
+        np.maximum(out, 0., out=out)
+        return out
+
+    def daily_into(self, values, out):
+        """`daily(values)` written into `out` (shape (n_days,))."""
+        # Product with a vector of ones: `sum(axis=-1)` allocates a reduction buffer
+        np.matmul(values, self._ones, out=out)
+        np.multiply(out, 100 / self.n_hour, out=out)
+        return out
+
+    def daily(self, values):
+        """Daily yield (%) from per-timestep ratios, as in the scripts (`100 * sum / n_hour`)."""
+        return 100 * values.sum(axis=-1) / self.n_hour
+
+
+def time_basis(days=DAYS, n_hour=N_HOUR):
+    """
+    Time-only terms (3, n_days * n_hour): sin(gamma), cos(gamma) cos(h), cos(gamma) sin(h).
+
+    For any latitude / tilt / azimuth, sin(alpha) and the cosine of the incidence angle
+    are linear combinations of these 3 rows (see `panel_coefficients`).
+    """
+    gamma = d2r(declination(days))[:, None]
+    hra = hour_angles(n_hour)[None, :]
+    return np.stack([np.broadcast_to(np.sin(gamma), (len(days), n_hour)).ravel(),
+                     (np.cos(gamma) * np.cos(hra)).ravel(),
+                     (np.cos(gamma) * np.sin(hra)).ravel()])
+
+
+def panel_coefficients(lat, tilt=0., azimuth=0.):
+    """
+    Coefficients (N, 3) such that `coef @ time_basis()` is the cosine of the incidence angle
+    on the panels (degree, arrays of length N). With tilt = 0, it is sin(alpha).
+    """
+    L, b, pa = np.broadcast_arrays(*(d2r(np.atleast_1d(np.asarray(x, dtype=float)))
+                                     for x in (lat, tilt, azimuth)))
+    return np.stack([np.sin(L) * np.cos(b) - np.cos(L) * np.sin(b) * np.cos(pa),
+                     np.cos(L) * np.cos(b) + np.sin(L) * np.sin(b) * np.cos(pa),
+                     np.sin(b) * np.sin(pa)], axis=1)
+
+
+@profiler.wrap("yield_kernel")
+def annual_yield(lat, tilt, azimuth=0., mount="fixed", n_hour=N_HOUR, chunk=256, basis=None):
+    """
+    Yearly yield (%) of panels, each with its own latitude / tilt / azimuth (degree arrays).
+
+    Same normalisation as `yield_year.py`. `mount` is "fixed" (any azimuth)
+    or "rotative" (the `yield_year.py` model, azimuth unused).
+    """
+    if basis is None:
+        basis = time_basis(DAYS, n_hour)
+    lat, tilt, azimuth = np.broadcast_arrays(*(np.atleast_1d(np.asarray(x, dtype=float))
+                                               for x in (lat, tilt, azimuth)))
+    sun = panel_coefficients(lat)
+    if mount == "fixed":
+        pan = panel_coefficients(lat, tilt, azimuth)
+    elif mount == "rotative":
+        cb, sb = np.cos(d2r(tilt)), np.sin(d2r(tilt))
+    else:
+        raise ValueError("Unknown mount {}, choose among ('fixed', 'rotative')".format(mount))
+
+    out = np.empty(len(lat))
+    for i in range(0, len(lat), chunk):
+        sl = slice(i, i + chunk)
+        s = sun[sl] @ basis # sin(alpha)
+        if mount == "fixed":
+            c = pan[sl] @ basis
+        else:
+            c = sb[sl, None] * np.sqrt((1 - s**2).clip(0)) + cb[sl, None] * s
+        np.maximum(c, 0, out=c)
+        np.copyto(c, 0., where=s < 0)
+        out[sl] = c.sum(axis=1)
+    return out / (basis.shape[1]) * 2 * 100
+
+
+class Workspace:
+    """Buffers reused by the `SunPath.*_into` kernels, for one sun path shape."""
+
+    def __init__(self, path):
+        shape = path.alpha.shape
+        self.Y = np.empty(shape)
+        self.V_B = np.empty(shape)
+        self.V_AB = np.empty(shape)
+        self.tmp = np.empty(shape)
+
+
+def allocation_check(n_call=100, lat=50):
+    """
+    Bytes allocated in steady state by the `*_into` kernels, measured with `tracemalloc`
+    over `n_call` calls after a warm-up call. Return a dict kernel -> (peak, remaining) bytes.
+    """
+    import tracemalloc
+
+    path = SunPath(lat)
+    ws = Workspace(path)
+    out = np.empty(path.alpha.shape)
+    daily = np.empty(len(path.days))
+    kernels = {
+        "fixed_south_into": lambda b: path.daily_into(path.fixed_south_into(b, out, ws), daily),
+        "fixed_into": lambda b: path.daily_into(path.fixed_into(b, 20., out, ws), daily),
+    }
+
+    res = {}
+    tilts = np.linspace(0, 90, n_call).tolist()
+    for name, func in kernels.items():
+        func(30.) # warm-up
+        tracemalloc.start()
+        start = tracemalloc.get_traced_memory()[0]
+        for b in tilts:
+            func(b)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        res[name] = (peak - start, current - start)
+    return res
+
+
+if __name__ == "__main__":
+
+    # One year sun path is 365 x N_HOUR floats, i.e. ~580 kB per temporary array.
+    for name, (peak, remaining) in allocation_check().items():
+        print("{:18s} peak {:6d} B, remaining {:6d} B over 100 calls".format(name, peak, remaining))
@@ -0,0 +1,262 @@
+"""
+Small HTTP JSON service answering yield queries.
+
+    GET /yield?lat=50&day=172&tilt=30[&azimuth=0]
+    -> {"lat": 50.0, "day": 172, "tilt": 30.0, "azimuth": 0.0, "yield": 7.83}
+
+`yield` is the daily yield of a fixed panel in full-sun hours (kWh per kW under
+a 1000 W/m² beam), from `yield_kernel.daily_yield`. Angles are rounded to
+`RESOLUTION` degrees, `day` is 0 - 364, `azimuth` from south, positive west.
+
+    GET /stats -> number of requests, batches, cache hits...
+
+The requests received during one tick are not computed one by one: they are
+coalesced, identical ones answered by the same computation, and the others
+grouped by latitude, each group being a single `daily_yield` call.
+Large groups are sent to a process pool so the event loop keeps serving.
+The last results are kept in memory (LRU).
+
+Only the standard library and numpy are used.
+
+Usage:
+
+    python3 yield_service.py serve [port]
+    python3 yield_service.py bench [n_clients] [n_requests]
+
+`bench` starts the service and a local load generator, and prints latency
+percentiles and throughput.
+"""
+
+import asyncio
+import json
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from yield_kernel import daily_yield
+
+RESOLUTION = 0.1
+TICK = 0.002 # s, coalescing window
+POOL_MIN = 256 # configurations of a latitude group above which the process pool is used
+CACHE_SIZE = 100000
+
+
+def _compute_group(lat, configs, days):
+    """Yield of each (tilt, azimuth, day) row of `configs` / `days` for one latitude."""
+    unique, inverse = np.unique(configs, axis=0, return_inverse=True)
+    udays, dinv = np.unique(days, return_inverse=True)
+    res = daily_yield(lat, unique[:, 0], unique[:, 1], days=udays)
+    return res[inverse.ravel(), dinv]
+
+
+class YieldService:
+
+    def __init__(self, tick=TICK, pool_min=POOL_MIN, cache_size=CACHE_SIZE, workers=None):
+        self.tick = tick
+        self.pool_min = pool_min
+        self.cache_size = cache_size
+        self.workers = workers
+        self.cache = OrderedDict()
+        self.pending = {} # key -> future, for the current tick
+        self.pool = None
+        self.stats = {"requests": 0, "cache_hits": 0, "coalesced": 0, "computed": 0,
+                      "batches": 0, "pool_batches": 0}
+        self._flush = None
+        self._tasks = set()
+
+    @staticmethod
+    def key(lat, day, tilt, azimuth):
+        q = lambda x: round(round(x / RESOLUTION) * RESOLUTION, 6)
+        if not -90 <= lat <= 90 or not 0 <= day < 365:
+            raise ValueError("lat must be in [-90, 90] and day in [0, 364]")
+        return q(lat), int(day), q(tilt), q(azimuth)
+
+    async def query(self, lat, day, tilt, azimuth=0.):
+        """Daily yield of one configuration (coalesced with the other queries of the tick)."""
+        k = self.key(lat, day, tilt, azimuth)
+        self.stats["requests"] += 1
+        if k in self.cache:
+            self.stats["cache_hits"] += 1
+            self.cache.move_to_end(k)
+            return self.cache[k]
+        if k in self.pending:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(self.pending[k])
+
+        loop = asyncio.get_running_loop()
+        self.pending[k] = loop.create_future()
+        if self._flush is None:
+            self._flush = loop.call_later(self.tick, self._start_flush)
+        # Shared by the coalesced queries: a cancelled caller must not cancel it for the others
+        return await asyncio.shield(self.pending[k])
+
+    def _start_flush(self):
+        # The loop only keeps weak references to its tasks: hold them until they are done
+        task = asyncio.ensure_future(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self):
+        """Compute all the pending queries, one batch per latitude."""
+        pending, self.pending, self._flush = self.pending, {}, None
+        keys = np.array(list(pending), dtype=float)
+        loop = asyncio.get_running_loop()
+
+        jobs = []
+        for lat in np.unique(keys[:, 0]):
+            rows = np.flatnonzero(keys[:, 0] == lat)
+            configs, days = keys[rows][:, [2, 3]], keys[rows, 1].astype(int)
+            if len(rows) >= self.pool_min:
+                if self.pool is None:
+                    self.pool = ProcessPoolExecutor(self.workers)
+                job = loop.run_in_executor(self.pool, _compute_group, lat, configs, days)
+                self.stats["pool_batches"] += 1
+            else:
+                # Small group: inline, errors go to the futures of this group only
+                job = loop.create_future()
+                try:
+                    job.set_result(_compute_group(lat, configs, days))
+                except Exception as e:
+                    job.set_exception(e)
+            jobs.append((rows, job))
+            self.stats["batches"] += 1
+
+        futures = list(pending.values())
+        items = list(pending)
+        for rows, job in jobs:
+            try:
+                values = await job
+            except Exception as e:
+                for r in rows:
+                    if not futures[r].done():
+                        futures[r].set_exception(e)
+                continue
+            values = [float(v) for v in values]
+            for r, v in zip(rows, values):
+                self._store(items[r], v)
+            for r, v in zip(rows, values):
+                if not futures[r].done():
+                    futures[r].set_result(v)
+        self.stats["computed"] += len(items)
+
+    def _store(self, k, v):
+        self.cache[k] = v
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def handle(self, reader, writer):
+        """One HTTP/1.1 request per connection."""
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            method, target, _ = request.decode("latin-1").split(" ", 2)
+            status, body = await self.route(method, target)
+        except Exception as e:
+            status, body = 400, {"error": str(e)}
+
+        data = json.dumps(body).encode()
+        writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                     "Connection: close\r\n\r\n".format(status, "OK" if status == 200 else "Error",
+                                                        len(data)).encode() + data)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def route(self, method, target):
+        url = urlsplit(target)
+        if method != "GET":
+            return 405, {"error": "only GET is supported"}
+        if url.path == "/stats":
+            return 200, dict(self.stats, cache_size=len(self.cache))
+        if url.path != "/yield":
+            return 404, {"error": "unknown path {}".format(url.path)}
+
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            lat, day, tilt = float(q["lat"]), int(q["day"]), float(q["tilt"])
+            azimuth = float(q.get("azimuth", 0))
+        except KeyError as e:
+            return 400, {"error": "missing parameter {}".format(e)}
+        lat, day, tilt, azimuth = self.key(lat, day, tilt, azimuth)
+        value = await self.query(lat, day, tilt, azimuth)
+        return 200, {"lat": lat, "day": day, "tilt": tilt, "azimuth": azimuth, "yield": value}
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+async def _get(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write("GET {} HTTP/1.1\r\nHost: {}\r\n\r\n".format(path, host).encode())
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    return json.loads(data.split(b"\r\n\r\n", 1)[1])
+
+
+async def load_test(host, port, n_clients=50, n_requests=2000, seed=0):
+    """Random queries from `n_clients` concurrent clients. Return latency percentiles (ms) and throughput."""
+    rng = np.random.default_rng(seed)
+    queries = np.stack([rng.integers(30, 60, n_requests), rng.integers(0, 365, n_requests),
+                        rng.integers(0, 90, n_requests), rng.integers(-90, 90, n_requests)], axis=1)
+    latencies = []
+
+    async def client(part):
+        for lat, day, tilt, az in part:
+            t = time.perf_counter()
+            await _get(host, port, "/yield?lat={}&day={}&tilt={}&azimuth={}".format(lat, day, tilt, az))
+            latencies.append(time.perf_counter() - t)
+
+    t = time.perf_counter()
+    await asyncio.gather(*[client(p) for p in np.array_split(queries, n_clients)])
+    elapsed = time.perf_counter() - t
+
+    lat_ms = 1000 * np.array(latencies)
+    return {"p50_ms": np.percentile(lat_ms, 50), "p90_ms": np.percentile(lat_ms, 90),
+            "p99_ms": np.percentile(lat_ms, 99), "requests_per_s": n_requests / elapsed}
+
+
+async def _bench(n_clients, n_requests, port=8765):
+    service = YieldService()
+    server = await service.serve(port=port)
+    try:
+        for run in ("cold", "warm"): # the second run is answered from the cache
+            res = await load_test("127.0.0.1", port, n_clients, n_requests)
+            print("{}: {:.0f} req/s, latency p50 {:.1f} ms, p90 {:.1f} ms, p99 {:.1f} ms".format(
+                run, res["requests_per_s"], res["p50_ms"], res["p90_ms"], res["p99_ms"]))
+        print(await _get("127.0.0.1", port, "/stats"))
+    finally:
+        server.close()
+        service.close()
+
+
+async def _serve(port):
+    service = YieldService()
+    server = await service.serve(port=port)
+    print("Serving on http://127.0.0.1:{}/yield".format(port))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    if cmd == "serve":
+        asyncio.run(_serve(int(sys.argv[2]) if len(sys.argv) > 2 else 8765))
+    else:
+        n_clients = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+        n_requests = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+        asyncio.run(_bench(n_clients, n_requests))
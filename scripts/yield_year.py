@@ -6,12 +6,12 @@ Assumption that the panel rotate on the ground, at the hour angle speed.
 
 """
 
-from bokeh.plotting  import ColumnDataSource, figure, output_file, show
-from bokeh.models    import HoverTool, CustomJS, Slider
-from bokeh.layouts   import column
-
 import numpy as np
 
+import jit_backend
+from result_cache import ResultCache
+from profiling import profiler
+
 def d2r(x):
     return x/180 * np.pi
 
@@ -19,7 +19,40 @@ def r2d(x):
     return x / np.pi * 180
 
 
+def yearly_yield(lat0, beta_range, hra, backend=None):
+    """
+    Average yield (%) over the year for each tilt angle of `beta_range`.
+    `backend`: "auto", "numba" or "numpy" (see `jit_backend.py`).
+    """
+    if jit_backend.use_jit(backend):
+        # Sun angles and yields in one compiled loop (and the compilation on the first call)
+        with profiler.stage("jit_kernel"):
+            return jit_backend.yearly_yield(lat0, beta_range, hra)
+
+    yields = np.zeros(len(beta_range))
+
+    for N in range(365):
+        gamma0 =  23.433333 * np.sin(2 * np.pi * (N + 284) / 365);
+
+        with profiler.stage("sun_position"):
+            A = np.sin(d2r(gamma0)) * np.sin(d2r(lat0))
+            B = np.cos(d2r(gamma0)) * np.cos(d2r(lat0)) 
+            angles = np.arcsin(A + B * np.cos(hra))
+            angles = angles[angles >= 0]
+        
+        for idx, beta in enumerate(beta_range):
+            yields[idx] += np.sin(d2r(beta) + angles).clip(0).sum()
+        
+    return yields / (len(hra) * 365) * 2 * 100
+
+
 if __name__ == "__main__":
+    from bokeh.plotting  import ColumnDataSource, figure, output_file, show
+    from bokeh.models    import HoverTool, CustomJS, Slider
+    from bokeh.layouts   import column
+
+    profiler.enable_from_argv()
+
     
     # Default param
     lat0  = 50
@@ -29,24 +62,17 @@ if __name__ == "__main__":
     hra    = d2r(15 * (hours - 12)) 
     beta_range = np.arange(90)
     
-    # Compute yield for each day of the year
-    yields = np.zeros(len(beta_range))
-
-    for N in range(365):
-        gamma0 =  23.433333 * np.sin(2 * np.pi * (N + 284) / 365);
-
-        A = np.sin(d2r(gamma0)) * np.sin(d2r(lat0))
-        B = np.cos(d2r(gamma0)) * np.cos(d2r(lat0)) 
-        angles = np.arcsin(A + B * np.cos(hra))
-        angles = angles[angles >= 0]
-        
-        for idx, beta in enumerate(beta_range):
-            yields[idx] += np.sin(d2r(beta) + angles).clip(0).sum()
-        
-    yields = yields / (len(hra) * 365) * 2 * 100
+    profiler.start("yield_kernel")
+    # Compute yield for each day of the year (cached on disk)
+    yields = ResultCache().cached("yield_year",
+            dict(lat=lat0, beta=beta_range, hra=hra),
+            lambda: {"yields": yearly_yield(lat0, beta_range, hra)},
+            sources=[__file__])["yields"]
 
     # Initialize tources
+    profiler.start("reduction")
     b_max = beta_range[np.argmax(yields)]
+    profiler.start("bokeh_model")
     source = ColumnDataSource(data=dict(x=beta_range, y=yields, xx=d2r(beta_range)))
     source_t = ColumnDataSource(data=dict(t=np.cos(hra)))
     source_m = ColumnDataSource(data=dict(x=[b_max, b_max], y=[0, np.max(yields)])) # Max line
@@ -147,7 +173,9 @@ if __name__ == "__main__":
     p.xgrid.ticker = [i*5 for i in range(19)]
     p.xaxis.ticker = [i*5 for i in range(19)]
 
+    profiler.start("save")
     output_file("../html/yield_year.html", title="Average yield over the year.")
     show(column(p, slider_lat))
+    profiler.report()
     
 